@@ -0,0 +1,99 @@
+"""
+Büyük odalarda başlatma/bitirme maliyeti.
+
+10.000 kişilik bir odada sayaç başlatma (herkesin oturum başlangıcını yazma) ve
+bitirme (süreleri hesaplayıp puanlara ekleme) işlemlerini karşılaştırır:
+eski kullanıcı nesnesi başına döngü, array modülüyle sütunlar ve (kuruluysa) NumPy sütunları.
+
+Kullanım:
+    python benchmarks/batch_scoring.py
+"""
+
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+ROOM_SIZE = 10_000
+ROUNDS = 20
+MAX_DURATION = main.DEFAULT_WORK_DURATION
+
+
+class LegacyParticipant:
+    """Değişiklik öncesi kullanıcı: puan ve oturum başlangıcı nesnenin alanlarında"""
+
+    __slots__ = ("id", "name", "total_seconds", "current_session_start", "remote")
+
+    def __init__(self, i: int):
+        self.id = f"{i:032x}"
+        self.name = f"user-{i}"
+        self.total_seconds = 0
+        self.current_session_start = None
+        self.remote = False
+
+
+class LegacyRoom:
+    """Değişiklik öncesi başlatma/bitirme döngüleri"""
+
+    def __init__(self):
+        self.users = {user.id: user for user in (LegacyParticipant(i) for i in range(ROOM_SIZE))}
+
+    def set_session_start(self, ts):
+        for user in self.users.values():
+            if not user.remote:
+                user.current_session_start = ts
+
+    def finish_sessions(self, now, max_duration):
+        rewarded = []
+        for user in self.users.values():
+            if user.current_session_start is not None:
+                elapsed_seconds = int(now - user.current_session_start)
+                earned_seconds = max(0, min(elapsed_seconds, max_duration))
+                if earned_seconds:
+                    user.total_seconds += earned_seconds
+                    rewarded.append((user, earned_seconds, user.current_session_start))
+            user.current_session_start = None
+        return rewarded
+
+
+def columns_room(columns_class):
+    room = main.Room("bench")
+    room.columns = columns_class()
+    for i in range(ROOM_SIZE):
+        room.add_user(main.Participant(f"user-{i}", participant_id=f"{i:032x}"))
+    return room
+
+
+def measure(label: str, room):
+    start_time = finish_time = 0.0
+    rewarded = 0
+    for round_index in range(ROUNDS):
+        session_start = 1_700_000_000.0 + round_index * 3600
+
+        started = time.perf_counter()
+        room.set_session_start(session_start)
+        start_time += time.perf_counter() - started
+
+        started = time.perf_counter()
+        rewarded = len(room.finish_sessions(session_start + 1500.5, MAX_DURATION))
+        finish_time += time.perf_counter() - started
+
+    print(f"{label:<8} başlat={start_time / ROUNDS * 1000:8.3f} ms  "
+          f"bitir={finish_time / ROUNDS * 1000:8.3f} ms  (puan alan={rewarded})")
+
+
+def main_cli():
+    print(f"{ROOM_SIZE} kişilik oda, {ROUNDS} tur ortalaması")
+    measure("eski", LegacyRoom())
+    measure("array", columns_room(main.ParticipantColumns))
+    if main.numpy is not None:
+        measure("numpy", columns_room(main.NumpyParticipantColumns))
+    else:
+        print("numpy    kurulu değil")
+
+
+if __name__ == "__main__":
+    main_cli()
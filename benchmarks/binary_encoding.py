@@ -0,0 +1,81 @@
+"""
+JSON ve MessagePack (sayı kodlu alanlar, epoch-ms zaman damgaları) karşılaştırması.
+
+Tipik olaylar için olay başına bayt, sunucuda bir kez kodlama süresi ve alıcı başına
+çözme süresi ölçülür; RECIPIENTS kişilik bir odaya yayında toplam bayt ve çözme CPU'su gösterilir.
+msgpack kurulu değilse yalnızca JSON ölçülür.
+
+Kullanım:
+    python benchmarks/binary_encoding.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+RECIPIENTS = 1000
+REPEAT = 200
+
+
+def user(i: int) -> dict:
+    return {"name": f"Kullanıcı {i}", "id": f"{i:032x}", "total_seconds": i * 60}
+
+
+def sample_messages():
+    return [
+        ("timer_started", {"type": "timer_started", "remaining_seconds": 1500,
+                           "target_timestamp": "2024-01-01T10:25:00.123456+00:00",
+                           "is_running": True, "mode": "work"}),
+        ("rank_changed x50", {"type": "rank_changed", "seq": 1234,
+                              "changes": [{"id": f"{i:032x}", "total_seconds": 1500 + i, "rank": i}
+                                          for i in range(50)]}),
+        ("presence x50", {"type": "presence", "seq": 1235,
+                          "added": [{"user": user(i), "rank": i} for i in range(50)],
+                          "removed": [], "joined": [f"Kullanıcı {i}" for i in range(50)], "left": []}),
+        ("user_list x1000", {"type": "user_list_update", "seq": 1236,
+                             "users": [user(i) for i in range(1000)]}),
+    ]
+
+
+def measure(fn, *args) -> float:
+    start = time.process_time()
+    for _ in range(REPEAT):
+        fn(*args)
+    return (time.process_time() - start) / REPEAT * 1e6  # µs
+
+
+def encode_msgpack(message: dict) -> bytes:
+    return main.msgpack.packb(main.to_binary_message(message), use_bin_type=True)
+
+
+def decode_msgpack(data: bytes):
+    return main.msgpack.unpackb(data, raw=False, strict_map_key=False)
+
+
+def report(label: str, codec: str, data, encode_us: float, decode_us: float):
+    total_kib = len(data) * RECIPIENTS / 1024
+    decode_ms = decode_us * RECIPIENTS / 1000
+    print(f"{label:<18} {codec:<8} bayt={len(data):<7} kodlama={encode_us:8.1f} µs  "
+          f"çözme={decode_us:8.1f} µs  | {RECIPIENTS} alıcı: {total_kib:9.1f} KiB, çözme {decode_ms:8.1f} ms")
+
+
+def main_cli():
+    if main.msgpack is None:
+        print("msgpack kurulu değil; yalnızca JSON ölçülüyor (pip install msgpack)")
+
+    for label, message in sample_messages():
+        data = main.json_encoder(message)
+        report(label, "json", data.encode("utf-8"),
+               measure(main.json_encoder, message), measure(json.loads, data))
+        if main.msgpack is not None:
+            data = encode_msgpack(message)
+            report(label, "msgpack", data, measure(encode_msgpack, message), measure(decode_msgpack, data))
+
+
+if __name__ == "__main__":
+    main_cli()
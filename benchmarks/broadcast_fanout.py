@@ -0,0 +1,127 @@
+"""
+Yayın (fan-out) gecikme ölçümü.
+
+Sahte WebSocket'lerle 10, 100 ve 1000 kişilik odalar kurar, bir kısmını yavaş
+istemci yapar ve sağlıklı istemcilere mesajın ulaşma gecikmesini (p50/p99) ölçer.
+Eski sıralı `await send_json` döngüsü ile bağlantı başına kuyruk yaklaşımı karşılaştırılır.
+
+Kullanım:
+    python benchmarks/broadcast_fanout.py
+"""
+
+import asyncio
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+main.logger.setLevel(logging.WARNING)
+
+ROOM_SIZES = (10, 100, 1000)
+MESSAGES = 50
+SLOW_RATIO = 0.05        # odadaki yavaş istemci oranı
+SLOW_SEND_DELAY = 0.02   # yavaş istemcinin her gönderimde beklediği süre (sn)
+
+
+class FakeWebSocket:
+    def __init__(self, sent_at: dict, latencies: list, delay: float = 0.0):
+        self.sent_at = sent_at
+        self.latencies = latencies
+        self.delay = delay
+
+    async def _deliver(self, message: dict):
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        else:
+            await asyncio.sleep(0)
+        seq = message.get("seq")
+        if seq is not None and not self.delay:
+            self.latencies.append(time.perf_counter() - self.sent_at[seq])
+
+    async def send_json(self, message: dict):
+        await self._deliver(message)
+
+    async def send_text(self, text: str):
+        # Yalnızca ölçüm mesajları çözülür; katılım/kullanıcı listesi çerçeveleri atlanır
+        await self._deliver(json.loads(text) if '"bench"' in text else {})
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(len(values) * pct / 100))
+    return values[index]
+
+
+async def legacy_broadcast(sockets, message):
+    """Değişiklik öncesi davranış: soketler tek tek beklenir."""
+    for websocket in sockets:
+        await websocket.send_json(message)
+
+
+async def run_legacy(room_size: int):
+    sent_at, latencies = {}, []
+    slow_count = max(1, int(room_size * SLOW_RATIO))
+    sockets = [FakeWebSocket(sent_at, latencies, SLOW_SEND_DELAY if i < slow_count else 0.0)
+               for i in range(room_size)]
+    for seq in range(MESSAGES):
+        sent_at[seq] = time.perf_counter()
+        await legacy_broadcast(sockets, {"type": "bench", "seq": seq})
+    return latencies
+
+
+async def run_queued(room_size: int):
+    sent_at, latencies = {}, []
+    slow_count = max(1, int(room_size * SLOW_RATIO))
+    manager = main.ConnectionManager()
+    room_id = f"bench-{room_size}"
+    for i in range(room_size):
+        websocket = FakeWebSocket(sent_at, latencies, SLOW_SEND_DELAY if i < slow_count else 0.0)
+        await manager.connect(websocket, room_id, f"user-{i}")
+        # Yazıcılara sıra ver; aksi halde katılım deltaları kuyrukları taşırır
+        await asyncio.sleep(0)
+
+    # Katılım mesajlarının boşalmasını bekle (yavaş istemciler hariç)
+    connections = manager.active_connections[room_id].values()
+    while any(conn.queue for conn in connections if not conn.websocket.delay):
+        await asyncio.sleep(0.01)
+    latencies.clear()
+
+    for seq in range(MESSAGES):
+        sent_at[seq] = time.perf_counter()
+        await manager.broadcast({"type": "bench", "seq": seq}, room_id)
+        await asyncio.sleep(0)
+
+    expected = (room_size - slow_count) * MESSAGES
+    deadline = time.perf_counter() + 30
+    while len(latencies) < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+
+    for websocket in list(manager.active_connections.get(room_id, {})):
+        manager.disconnect(websocket, room_id)
+    await asyncio.sleep(0)
+    return latencies
+
+
+def report(label: str, room_size: int, latencies):
+    ms = [value * 1000 for value in latencies]
+    print(f"{label:<8} oda={room_size:<5} teslim={len(ms):<7} "
+          f"p50={percentile(ms, 50):8.2f} ms  p99={percentile(ms, 99):8.2f} ms  "
+          f"ort={statistics.fmean(ms) if ms else 0:8.2f} ms")
+
+
+async def main_async():
+    for room_size in ROOM_SIZES:
+        report("sıralı", room_size, await run_legacy(room_size))
+        report("kuyruk", room_size, await run_queued(room_size))
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,347 @@
+"""
+WebSocket oda protokolü için yük testi.
+
+Sunucuyu alt süreçte (varsayılan), aynı süreçte ya da verilen bir adreste çalıştırır;
+birçok odaya binlerce istemci bağlar ve her odada bir "lider" istemciyle
+update_settings / start_timer / stop_timer / reset_timer / timer_completed akışını sürer.
+
+Raporlanan değerler:
+  - bağlantı/sn (bağlantı açılıp ilk timer_state alınana kadar)
+  - yayın gecikmesi yüzdelikleri (lider komutu gönderdi -> her istemci yayını aldı)
+  - timer_finished gecikmesi (sunucudaki bitiş anına göre)
+  - sunucu süreci CPU süresi ve RSS
+
+Kullanım:
+    python benchmarks/loadtest.py --clients 2000 --rooms 100 --cycles 3
+    python benchmarks/loadtest.py --mode inprocess
+    python benchmarks/loadtest.py --mode external --url ws://127.0.0.1:8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import websockets
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Yük testi sırasında kullanılan çalışma süresi (sn); timer_completed akışını da sürer
+TIMER_SECONDS = 2
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+class ProcessSampler:
+    """Bir sürecin CPU süresini ve en yüksek RSS değerini /proc üzerinden izler (Linux)"""
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.peak_rss = 0
+        self._task = None
+        self._cpu_start = 0.0
+        self._wall_start = 0.0
+
+    def cpu_seconds(self) -> float:
+        try:
+            with open(f"/proc/{self.pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+        except OSError:
+            return 0.0
+
+    def rss_bytes(self) -> int:
+        try:
+            with open(f"/proc/{self.pid}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        return int(line.split()[1]) * 1024
+        except OSError:
+            pass
+        return 0
+
+    async def _run(self):
+        while True:
+            self.peak_rss = max(self.peak_rss, self.rss_bytes())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self._cpu_start = self.cpu_seconds()
+        self._wall_start = time.perf_counter()
+        self._task = asyncio.create_task(self._run())
+
+    def stop(self) -> dict:
+        self._task.cancel()
+        cpu = self.cpu_seconds() - self._cpu_start
+        wall = time.perf_counter() - self._wall_start
+        return {"cpu_seconds": cpu, "cpu_percent": 100 * cpu / wall if wall else 0.0,
+                "peak_rss_mb": max(self.peak_rss, self.rss_bytes()) / 1e6}
+
+
+class Stats:
+    def __init__(self):
+        self.connect_times = []
+        self.latencies = {}
+        self.finish_lateness = []
+        self.messages = 0
+        self.errors = 0
+
+    def record(self, message_type: str, latency: float):
+        self.latencies.setdefault(message_type, []).append(latency)
+
+
+class RoomDriver:
+    """Bir odadaki istemcileri ve komut zamanlarını tutar"""
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.sent_at = {}  # yayın türü -> liderin komutu gönderdiği an
+        self.clients = []
+
+
+async def run_client(url: str, room: RoomDriver, index: int, stats: Stats, ready: asyncio.Event,
+                     stop: asyncio.Event):
+    started = time.perf_counter()
+    try:
+        websocket = await websockets.connect(f"{url}/ws/{room.room_id}", max_size=None)
+    except Exception:
+        stats.errors += 1
+        return None
+    room.clients.append(websocket)
+    await websocket.send(json.dumps({"type": "connect", "user_name": f"yük-{room.room_id}-{index}"}))
+
+    async def reader():
+        got_state = False
+        try:
+            async for raw in websocket:
+                now = time.perf_counter()
+                stats.messages += 1
+                message = json.loads(raw)
+                message_type = message.get("type")
+                if message_type == "timer_state" and not got_state:
+                    got_state = True
+                    stats.connect_times.append(now - started)
+                    ready.set()
+                sent_at = room.sent_at.get(message_type)
+                if sent_at is not None:
+                    stats.record(message_type, now - sent_at)
+                if message_type == "ping":
+                    await safe_send(websocket, {"type": "pong"})
+                elif message_type == "timer_started":
+                    # Tarayıcı gibi: süre dolunca "timer_completed" gönder
+                    target = datetime.fromisoformat(message["target_timestamp"]).timestamp()
+                    asyncio.get_running_loop().call_later(
+                        max(0.0, target - time.time()),
+                        lambda: asyncio.ensure_future(safe_send(websocket, {"type": "timer_completed"}))
+                    )
+                    room.target = target
+                elif message_type == "timer_finished":
+                    target = getattr(room, "target", None)
+                    if target is not None:
+                        stats.finish_lateness.append(time.time() - target)
+        except websockets.ConnectionClosed:
+            pass
+        except Exception:
+            stats.errors += 1
+
+    task = asyncio.create_task(reader())
+    await stop.wait()
+    await websocket.close()
+    await task
+
+
+async def safe_send(websocket, message: dict):
+    try:
+        await websocket.send(json.dumps(message))
+    except websockets.ConnectionClosed:
+        pass
+
+
+async def drive_room(room: RoomDriver, cycles: int, step: float):
+    """Lider istemci protokolün tüm komutlarını sırayla gönderir"""
+    leader = room.clients[0]
+    for _ in range(cycles):
+        commands = [
+            ({"type": "update_settings", "work_duration": TIMER_SECONDS, "short_break": 60, "long_break": 120},
+             "settings_updated", step),
+            ({"type": "start_timer"}, "timer_started", step),
+            ({"type": "stop_timer"}, "timer_stopped", step),
+            ({"type": "start_timer"}, "timer_started", TIMER_SECONDS + step),
+            ({"type": "reset_timer", "mode": "work"}, "timer_reset", step),
+        ]
+        for command, expected, wait in commands:
+            room.sent_at = {expected: time.perf_counter()}
+            await safe_send(leader, command)
+            await asyncio.sleep(wait)
+
+
+async def wait_for_server(host: str, port: int, timeout: float = 20.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection(host, port)
+            writer.write(b"GET /health HTTP/1.0\r\n\r\n")
+            await writer.drain()
+            response = await reader.read()
+            writer.close()
+            if b"200" in response.split(b"\r\n", 1)[0]:
+                return
+        except OSError:
+            pass
+        await asyncio.sleep(0.1)
+    raise RuntimeError("Sunucu zamanında ayağa kalkmadı")
+
+
+async def fetch_text(host: str, port: int, path: str) -> str:
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"GET {path} HTTP/1.0\r\n\r\n".encode())
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    return response.split(b"\r\n\r\n", 1)[-1].decode("utf-8")
+
+
+async def run(args):
+    raise_fd_limit()
+    server_process = None
+    server_task = None
+    host = "127.0.0.1"
+
+    if args.mode == "external":
+        url = args.url.rstrip("/")
+        host, port = url.split("//", 1)[1].split(":")
+        port = int(port)
+        sampler = None
+    else:
+        port = free_port()
+        url = f"ws://{host}:{port}"
+        env = dict(os.environ, PERSISTENCE="none")
+        if args.mode == "subprocess":
+            server_process = subprocess.Popen(
+                [sys.executable, "-m", "uvicorn", "main:app", "--host", host, "--port", str(port),
+                 "--log-level", "warning", "--ws-max-queue", "1024"],
+                cwd=str(ROOT), env=env,
+                stderr=None if args.server_log else subprocess.DEVNULL
+            )
+            pid = server_process.pid
+        else:
+            import logging
+            import uvicorn
+
+            os.environ["PERSISTENCE"] = "none"
+            sys.path.insert(0, str(ROOT))
+            import main
+
+            main.logger.setLevel(logging.WARNING)
+            server = uvicorn.Server(uvicorn.Config(main.app, host=host, port=port, log_level="warning"))
+            server_task = asyncio.create_task(server.serve())
+            pid = os.getpid()  # not: istemcilerin CPU'su da dahildir
+        await wait_for_server(host, port)
+        sampler = ProcessSampler(pid)
+        sampler.start()
+
+    stats = Stats()
+    stop = asyncio.Event()
+    rooms = [RoomDriver(f"yuk-{i}") for i in range(args.rooms)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+    client_tasks = []
+
+    async def open_client(room, index):
+        ready = asyncio.Event()
+        async with semaphore:
+            task = asyncio.create_task(run_client(url, room, index, stats, ready, stop))
+            client_tasks.append(task)
+            await asyncio.wait([asyncio.ensure_future(ready.wait()), task], return_when=asyncio.FIRST_COMPLETED)
+
+    connect_started = time.perf_counter()
+    await asyncio.gather(*(open_client(rooms[i % args.rooms], i) for i in range(args.clients)))
+    connect_elapsed = time.perf_counter() - connect_started
+    await asyncio.sleep(1.0)  # katılım yayınlarının oturmasını bekle
+
+    drive_started = time.perf_counter()
+    await asyncio.gather(*(drive_room(room, args.cycles, args.step) for room in rooms if room.clients))
+    drive_elapsed = time.perf_counter() - drive_started
+
+    server_metrics = ""
+    try:
+        server_metrics = await fetch_text(host, port, "/metrics")
+    except OSError:
+        pass
+
+    resources = sampler.stop() if sampler else None
+    stop.set()
+    await asyncio.gather(*client_tasks, return_exceptions=True)
+
+    if server_process is not None:
+        server_process.terminate()
+        server_process.wait()
+    if server_task is not None:
+        server.should_exit = True
+        await server_task
+
+    connected = len(stats.connect_times)
+    print(f"\nİstemci: {args.clients}  oda: {args.rooms}  tur: {args.cycles}  mod: {args.mode}")
+    print(f"Bağlantı: {connected} başarılı, {stats.errors} hata, "
+          f"{connected / connect_elapsed:8.1f} bağlantı/sn  "
+          f"(katılım p50={percentile(stats.connect_times, 50) * 1000:.1f} ms "
+          f"p99={percentile(stats.connect_times, 99) * 1000:.1f} ms)")
+    print(f"Mesaj: {stats.messages} alındı, {stats.messages / drive_elapsed:10.1f} mesaj/sn (sürüş süresince)")
+    print("Yayın gecikmesi (lider komutu -> istemci):")
+    for message_type, values in sorted(stats.latencies.items()):
+        ms = [value * 1000 for value in values]
+        print(f"  {message_type:<17} n={len(ms):<7} p50={percentile(ms, 50):8.2f} ms  "
+              f"p90={percentile(ms, 90):8.2f} ms  p99={percentile(ms, 99):8.2f} ms  "
+              f"max={max(ms):8.2f} ms")
+    if stats.finish_lateness:
+        ms = [value * 1000 for value in stats.finish_lateness]
+        print(f"  timer_finished    n={len(ms):<7} p50={percentile(ms, 50):8.2f} ms  "
+              f"p99={percentile(ms, 99):8.2f} ms  (bitiş anına göre)")
+    if resources:
+        print(f"Sunucu: CPU {resources['cpu_seconds']:.2f} sn (%{resources['cpu_percent']:.0f}), "
+              f"en yüksek RSS {resources['peak_rss_mb']:.1f} MB")
+    for line in server_metrics.splitlines():
+        if line.startswith(("pomodoro_send_dropped_total", "pomodoro_send_failures_total",
+                            "pomodoro_event_loop_lag_seconds ")):
+            print(f"  {line}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=1000, help="toplam istemci sayısı")
+    parser.add_argument("--rooms", type=int, default=50, help="oda sayısı")
+    parser.add_argument("--cycles", type=int, default=2, help="oda başına komut turu")
+    parser.add_argument("--step", type=float, default=0.5, help="komutlar arası bekleme (sn)")
+    parser.add_argument("--concurrency", type=int, default=200, help="aynı anda açılan bağlantı sayısı")
+    parser.add_argument("--mode", choices=("subprocess", "inprocess", "external"), default="subprocess")
+    parser.add_argument("--url", default="ws://127.0.0.1:8000", help="external modda sunucu adresi")
+    parser.add_argument("--server-log", action="store_true", help="alt süreç sunucu loglarını göster")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    asyncio.run(run(parse_args()))
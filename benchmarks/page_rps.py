@@ -0,0 +1,89 @@
+"""
+Sayfa servisi ölçümü (istek/sn).
+
+`/room/{id}` isteklerini ağ olmadan doğrudan ASGI uygulamasına gönderir.
+Eski davranış (her istekte Jinja `TemplateResponse` + GZipMiddleware ile
+istek başına sıkıştırma) ile önbellekteki, önceden sıkıştırılmış sayfa
+karşılaştırılır; Accept-Encoding başlığıyla ve başlıksız, ayrıca
+If-None-Match ile 304 yolu ölçülür.
+
+Kullanım:
+    python benchmarks/page_rps.py
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request  # noqa: E402
+from fastapi.middleware.gzip import GZipMiddleware  # noqa: E402
+
+import main  # noqa: E402
+
+main.logger.setLevel(logging.WARNING)
+
+REQUESTS = 2000
+
+
+def build_legacy_app() -> FastAPI:
+    """Değişiklik öncesi sayfa rotası: her istekte render + sıkıştırma"""
+    legacy = FastAPI()
+    legacy.add_middleware(GZipMiddleware, minimum_size=1024)
+
+    @legacy.get("/room/{room_id}")
+    async def read_room(request: Request, room_id: str):
+        return main.templates.TemplateResponse("index.html", {"request": request, "room_id": room_id})
+
+    return legacy
+
+
+async def request_once(app, path: str, headers: list) -> int:
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "query_string": b"", "root_path": "", "headers": headers,
+        "client": ("127.0.0.1", 1234), "server": ("testserver", 80),
+    }
+    size = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal size
+        if message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return size
+
+
+async def measure(label: str, app, headers: list):
+    size = await request_once(app, "/room/bench", headers)
+    started = time.perf_counter()
+    for i in range(REQUESTS):
+        await request_once(app, f"/room/bench-{i % 50}", headers)
+    elapsed = time.perf_counter() - started
+    print(f"{label:<28} {REQUESTS / elapsed:9.0f} istek/sn  gövde={size:>6} B")
+
+
+async def main_async():
+    legacy = build_legacy_app()
+    plain = [(b"host", b"testserver")]
+    gzipped = plain + [(b"accept-encoding", b"gzip, deflate, br")]
+    etag = main.index_page().variants[main.index_page().choose("gzip, deflate, br")][1]
+    revalidate = gzipped + [(b"if-none-match", etag.encode())]
+
+    await measure("eski (identity)", legacy, plain)
+    await measure("eski (gzip)", legacy, gzipped)
+    await measure("önbellek (identity)", main.app, plain)
+    await measure("önbellek (gzip/br)", main.app, gzipped)
+    await measure("önbellek (304)", main.app, revalidate)
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,89 @@
+"""
+Toplu katılımda presence mesaj sayısı.
+
+Aynı anda N kişinin aynı odaya katıldığı (ör. 09:00'da başlayan bir sınıf) senaryoyu
+sahte WebSocket'lerle kurar ve istemcilere giden toplam mesaj sayısı ile baytı sayar.
+PRESENCE_WINDOW=0 (her katılım ayrı yayın) ile biriktirme pencereli davranış karşılaştırılır.
+Kuyruğu taştığı için odadan çıkarılan her istemcinin soketinin de kapatıldığı doğrulanır
+(aksi halde istemci hiçbir şey almadan açık kalır ve yeniden bağlanmaz).
+
+Kullanım:
+    python benchmarks/presence_burst.py
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+main.logger.setLevel(logging.ERROR)
+
+ROOM_SIZES = (50, 200, 1000)
+WINDOWS = (0.0, 0.05, 0.1)
+JOIN_SPREAD = 0.2   # katılımların yayıldığı süre (sn)
+
+
+class CountingWebSocket:
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    async def send_text(self, text: str):
+        self.stats["messages"] += 1
+        self.stats["bytes"] += len(text)
+        if '"presence"' in text:
+            self.stats["presence"] += 1
+
+    async def close(self, code: int = 1000):
+        self.stats["closed"] += 1
+
+
+async def join(manager, stats, room_id: str, index: int, delay: float):
+    await asyncio.sleep(delay)
+    websocket = CountingWebSocket(stats)
+    await manager.call(room_id, manager.connect, websocket, room_id, f"user-{index}")
+    return websocket
+
+
+async def run(room_size: int, window: float):
+    manager = main.ConnectionManager(presence_window=window)
+    stats = {"messages": 0, "bytes": 0, "presence": 0, "dropped": 0, "closed": 0}
+    room_id = f"burst-{room_size}"
+
+    started = time.perf_counter()
+    sockets = await asyncio.gather(*(
+        join(manager, stats, room_id, i, JOIN_SPREAD * i / room_size) for i in range(room_size)
+    ))
+    await asyncio.sleep(window + 0.05)
+    connections = manager.active_connections[room_id].values()
+    while any(conn.queue for conn in connections):
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    # Kuyruğu taşan (delta alamadığı için bağlantısı kesilen) istemciler
+    stats["dropped"] = room_size - len(manager.active_connections[room_id])
+    await asyncio.sleep(0)
+    assert stats["closed"] == stats["dropped"], \
+        f"odadan çıkarılan {stats['dropped']} istemciden yalnızca {stats['closed']} tanesinin soketi kapatıldı"
+
+    for websocket in sockets:
+        manager.disconnect(websocket, room_id)
+    await asyncio.sleep(window + 0.05)
+    return stats, elapsed
+
+
+async def main_async():
+    for room_size in ROOM_SIZES:
+        for window in WINDOWS:
+            stats, elapsed = await run(room_size, window)
+            print(f"kişi={room_size:<5} pencere={window * 1000:5.0f} ms  "
+                  f"mesaj={stats['messages']:<8} presence={stats['presence']:<8} "
+                  f"bayt={stats['bytes'] / 1024:9.1f} KiB  kopan={stats['dropped']:<5} kapatılan={stats['closed']:<5} "
+                  f"süre={elapsed * 1000:7.1f} ms")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -0,0 +1,95 @@
+"""
+Boşta bekleyen odaların bellek maliyeti.
+
+Eski iç içe dict yapısı ile `Room`/`Participant` modelini 100.000 oda için
+tracemalloc ile karşılaştırır; ayrıca id ile katılma/ayrılma süresini ölçer.
+
+Kullanım:
+    python benchmarks/room_memory.py
+"""
+
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+ROOMS = 100_000
+ROOM_SIZE = 1_000
+
+
+def legacy_room() -> dict:
+    """Değişiklik öncesi oda yapısı"""
+    return {
+        "timer": {
+            "remaining_seconds": main.DEFAULT_WORK_DURATION,
+            "is_running": False,
+            "target_timestamp": None,
+            "mode": "work"
+        },
+        "settings": {
+            "work_duration": main.DEFAULT_WORK_DURATION,
+            "short_break": main.DEFAULT_SHORT_BREAK,
+            "long_break": main.DEFAULT_LONG_BREAK
+        },
+        "users": []
+    }
+
+
+def legacy_user(i: int) -> dict:
+    return {
+        "name": f"user-{i}",
+        "id": f"{i:032x}",
+        "joined_at": datetime.now(timezone.utc).isoformat(),
+        "total_seconds": 0,
+        "current_session_start": None
+    }
+
+
+def measure(factory) -> int:
+    tracemalloc.start()
+    rooms = {f"room-{i}": factory(f"room-{i}") for i in range(ROOMS)}
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rooms
+    return current
+
+
+def join_leave_legacy() -> float:
+    room = legacy_room()
+    users = [legacy_user(i) for i in range(ROOM_SIZE)]
+    start = time.perf_counter()
+    for user in users:
+        if not next((u for u in room["users"] if u["id"] == user["id"]), None):
+            room["users"].append(user)
+    for user in users:
+        room["users"] = [u for u in room["users"] if u["id"] != user["id"]]
+    return time.perf_counter() - start
+
+
+def join_leave_room() -> float:
+    room = main.Room("bench")
+    users = [main.Participant(f"user-{i}", participant_id=f"{i:032x}") for i in range(ROOM_SIZE)]
+    start = time.perf_counter()
+    for user in users:
+        room.add_user(user)
+    for user in users:
+        room.remove_user(user.id)
+    return time.perf_counter() - start
+
+
+def main_cli():
+    legacy = measure(lambda room_id: legacy_room())
+    typed = measure(main.Room)
+    print(f"{ROOMS} boş oda: dict={legacy / 1e6:7.1f} MB  Room={typed / 1e6:7.1f} MB  "
+          f"(oda başına {legacy / ROOMS:.0f} B -> {typed / ROOMS:.0f} B)")
+    print(f"{ROOM_SIZE} kişi katıl+ayrıl: dict={join_leave_legacy() * 1000:8.2f} ms  "
+          f"Room={join_leave_room() * 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,73 @@
+"""
+Yayın başına JSON kodlama maliyeti ölçümü.
+
+Eski yol her alıcı için `send_json` -> `json.dumps` çalıştırıyordu; yeni yol mesajı
+bir kez kodlayıp aynı çerçeveyi herkese gönderir. Olay başına CPU süresi karşılaştırılır.
+
+Kullanım:
+    python benchmarks/serialize_once.py
+"""
+
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+ROOM_SIZES = (10, 100, 500)
+EVENTS = 200
+
+
+def sample_user_list(size: int) -> dict:
+    return {
+        "type": "user_list_update",
+        "users": [{"name": f"Kullanıcı {i}", "id": f"{i:032x}", "total_seconds": i * 60}
+                  for i in range(size)],
+    }
+
+
+def per_recipient(message: dict, recipients: int):
+    """Değişiklik öncesi: her alıcı için ayrı json.dumps (starlette send_json)"""
+    for _ in range(recipients):
+        json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+def serialize_once(message: dict, recipients: int, encoder):
+    frame = main.Frame(message.get("type"), encoder(message))
+    sink = []
+    for _ in range(recipients):
+        sink.append(frame.data)
+
+
+def measure(fn, *args) -> float:
+    start = time.process_time()
+    for _ in range(EVENTS):
+        fn(*args)
+    return (time.process_time() - start) / EVENTS * 1e6  # µs / olay
+
+
+def main_cli():
+    encoders = [("stdlib", main._stdlib_dumps)]
+    if main.orjson is not None:
+        encoders.append(("orjson", main._orjson_dumps))
+
+    for size in ROOM_SIZES:
+        for label, message in (
+            ("timer_started", {"type": "timer_started", "remaining_seconds": 1500,
+                               "target_timestamp": "2024-01-01T10:25:00+00:00",
+                               "is_running": True, "mode": "work"}),
+            ("user_list_update", sample_user_list(size)),
+        ):
+            before = measure(per_recipient, message, size)
+            line = f"oda={size:<4} {label:<17} alıcı başına={before:10.1f} µs"
+            for name, encoder in encoders:
+                after = measure(serialize_once, message, size, encoder)
+                line += f"  bir kez[{name}]={after:9.1f} µs"
+            print(line)
+
+
+if __name__ == "__main__":
+    main_cli()
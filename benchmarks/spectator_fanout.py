@@ -0,0 +1,113 @@
+"""
+İzleyici (spectator) katmanının maliyeti.
+
+Bir sunucunun sayacı yönettiği, N kişinin yalnızca izlediği (canlı yayın benzeri) bir odayı
+sahte WebSocket'lerle kurar. İzleyiciler tam katılımcı olarak ve izleyici modunda bağlanır;
+katılım, art arda gelen sayaç olayları ve seans bitişi (puanlama) için sokete giden mesaj sayısı,
+bayt ve süre karşılaştırılır.
+
+Kullanım:
+    python benchmarks/spectator_fanout.py
+"""
+
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import main  # noqa: E402
+
+main.logger.setLevel(logging.ERROR)
+
+VIEWERS = (1000, 5000)
+TIMER_EVENTS = 20     # art arda gelen başlat/durdur komutu
+EVENT_SPACING = 0.01  # komutlar arası süre (sn)
+
+
+class CountingWebSocket:
+    def __init__(self, stats: dict):
+        self.stats = stats
+
+    async def send_text(self, text: str):
+        self.stats["messages"] += 1
+        self.stats["bytes"] += len(text)
+
+
+async def drain(manager, room_id: str):
+    """Tüm gönderim kuyruklarının boşalmasını bekler"""
+    connections = list(manager.active_connections.get(room_id, {}).values())
+    group = manager.spectators.get(room_id)
+    if group is not None:
+        connections.extend(group.connections.values())
+    await asyncio.sleep(manager.presence_window + 0.05)
+    while any(conn.queue for conn in connections):
+        await asyncio.sleep(0.01)
+
+
+async def phase(label: str, stats: dict, manager, room_id: str, action):
+    stats["messages"] = stats["bytes"] = 0
+    started = time.perf_counter()
+    await action()
+    await drain(manager, room_id)
+    elapsed = time.perf_counter() - started
+    return f"{label}: mesaj={stats['messages']:<8} bayt={stats['bytes'] / 1024:8.1f} KiB süre={elapsed * 1000:7.1f} ms"
+
+
+async def run(viewers: int, spectator: bool):
+    manager = main.ConnectionManager()
+    stats = {"messages": 0, "bytes": 0}
+    room_id = f"live-{viewers}-{int(spectator)}"
+    host = CountingWebSocket(stats)
+    await manager.call(room_id, manager.connect, host, room_id, "host")
+    sockets = []
+
+    async def join_all():
+        for i in range(viewers):
+            websocket = CountingWebSocket(stats)
+            sockets.append(websocket)
+            if spectator:
+                await manager.call(room_id, manager.connect_spectator, websocket, room_id)
+            else:
+                await manager.call(room_id, manager.connect, websocket, room_id, f"viewer-{i}")
+            await asyncio.sleep(0)
+
+    async def timer_events():
+        for i in range(TIMER_EVENTS):
+            command = manager.start_timer if i % 2 == 0 else manager.stop_timer
+            await manager.call(room_id, command, room_id)
+            await asyncio.sleep(EVENT_SPACING)
+        await asyncio.sleep(manager.spectator_interval)
+
+    async def finish():
+        await manager.call(room_id, manager.start_timer, room_id)
+        await manager.call(room_id, manager.finish_timer_and_reward, room_id)
+        await asyncio.sleep(manager.spectator_interval)
+
+    results = [
+        await phase("katılım", stats, manager, room_id, join_all),
+        await phase("sayaç", stats, manager, room_id, timer_events),
+        await phase("bitiş", stats, manager, room_id, finish),
+    ]
+    for websocket in sockets:
+        if spectator:
+            manager.disconnect_spectator(websocket, room_id)
+        else:
+            manager.disconnect(websocket, room_id)
+    manager.disconnect(host, room_id)
+    await asyncio.sleep(manager.presence_window + 0.05)
+    return results
+
+
+async def main_async():
+    for viewers in VIEWERS:
+        for spectator in (False, True):
+            mode = "izleyici" if spectator else "katılımcı"
+            for line in await run(viewers, spectator):
+                print(f"izleyen={viewers:<5} {mode:<9} {line}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main_async())
@@ -6,19 +6,64 @@ Leaderboard ve Adil Puanlama Sistemi Eklendi
 """
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Request, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.staticfiles import StaticFiles
 
-from datetime import datetime, timedelta, timezone
-from typing import Dict, Optional
+from array import array
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Deque, Dict, List, Optional, Tuple
 import uuid
 import asyncio
+import base64
+import bisect
+import gzip
+import hashlib
+import heapq
+import json
 import logging
+import math
+import operator
 import os
+import secrets
+import sqlite3
+import time
 from pathlib import Path
 
+# Hızlı JSON kodlayıcı (opsiyonel): orjson kuruluysa kullanılır
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson opsiyonel
+    orjson = None
+
+# MessagePack (opsiyonel): ikili mesaj kodlaması yalnızca kuruluysa sunulur
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - msgpack opsiyonel
+    msgpack = None
+
+# Brotli (opsiyonel): kuruluysa sayfanın brotli sürümü de hazırlanır
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli opsiyonel
+    brotli = None
+
+# NumPy (opsiyonel): kuruluysa oda başına kullanıcı sütunları vektörel işlenir, yoksa array modülü kullanılır
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy opsiyonel
+    numpy = None
+
+# Redis backplane (opsiyonel): yalnızca BACKPLANE=redis ile gerekir
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # pragma: no cover - redis opsiyonel
+    aioredis = None
+
 # Logging yapılandırması
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -35,291 +80,2681 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Templates klasörü
-BASE_DIR = Path(__file__).resolve().parent
-TEMPLATES_DIR = BASE_DIR / "templates"
-STATIC_DIR = BASE_DIR / "static"
 
-# Templates klasörünü kontrol et ve oluştur
-if not TEMPLATES_DIR.exists():
-    TEMPLATES_DIR.mkdir(exist_ok=True)
-    logger.warning(f"Templates klasörü bulunamadı, oluşturuldu: {TEMPLATES_DIR}")
+class PageAwareGZipMiddleware(GZipMiddleware):
+    """Sayfa rotalarını atlayan GZip; sayfalar zaten önceden sıkıştırılmış sunulur
+    (istek başına GzipFile kurulumu bu yolda ölçülebilir yavaşlık getiriyordu)"""
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and (scope["path"] == "/" or scope["path"].startswith("/room/")):
+            await self.app(scope, receive, send)
+            return
+        await super().__call__(scope, receive, send)
+
+
+# Diğer yanıtlar (ör. /metrics) için sıkıştırma
+app.add_middleware(PageAwareGZipMiddleware, minimum_size=1024)
+
+# Templates klasörü
+BASE_DIR = Path(__file__).resolve().parent
+TEMPLATES_DIR = BASE_DIR / "templates"
+STATIC_DIR = BASE_DIR / "static"
+
+# Templates klasörünü kontrol et ve oluştur
+if not TEMPLATES_DIR.exists():
+    TEMPLATES_DIR.mkdir(exist_ok=True)
+    logger.warning(f"Templates klasörü bulunamadı, oluşturuldu: {TEMPLATES_DIR}")
+
+templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+
+# Static dosyalar için
+if STATIC_DIR.exists():
+    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+
+# Varsayılan Pomodoro ayarları (saniye cinsinden)
+DEFAULT_WORK_DURATION = 25 * 60      # 25 dakika
+DEFAULT_SHORT_BREAK = 5 * 60         # 5 dakika
+DEFAULT_LONG_BREAK = 15 * 60         # 15 dakika
+
+# Yayın (fan-out) ayarları
+# Her bağlantının kendi gönderim kuyruğu vardır; kuyruk SEND_QUEUE_SIZE çerçeveyi ya da
+# SEND_BUFFER_BYTES boyutunu (kodlanmış JSON uzunluğu) aşarsa politika devreye girer:
+#   "coalesce"   -> aynı türdeki bekleyen eski mesajın yerine yenisini koy, yoksa en eski atılabilir mesajı at
+#   "drop"       -> yeni mesajı at
+#   "disconnect" -> yavaş istemcinin bağlantısını kes
+# Delta mesajları (DELTA_MESSAGE_TYPES) hiçbir zaman atılmaz; atılması gerekirse
+# istemcinin durumu bozulacağı için bağlantı kesilir ve istemci yeniden bağlanıp tam listeyi alır.
+SEND_QUEUE_SIZE = int(os.environ.get("SEND_QUEUE_SIZE", 64))
+SEND_BUFFER_BYTES = int(os.environ.get("SEND_BUFFER_BYTES", 1024 * 1024))
+SLOW_CONSUMER_POLICY = os.environ.get("SLOW_CONSUMER_POLICY", "coalesce")
+SLOW_CONSUMER_POLICIES = ("coalesce", "drop", "disconnect")
+# Yavaş istemcinin soketi bu kodla kapatılır (1013 "Try Again Later"); istemci yeniden bağlanıp güncel durumu alır
+SLOW_CONSUMER_CLOSE_CODE = 1013
+DELTA_MESSAGE_TYPES = frozenset({"presence", "rank_changed"})
+# Deltalara ek olarak "session" da atılmaz: yeni resume token'ı istemciye ulaşmazsa kayıt hayalet olarak kalır
+UNDROPPABLE_MESSAGE_TYPES = DELTA_MESSAGE_TYPES | {"session"}
+TIMER_MESSAGE_TYPES = frozenset({"timer_state", "timer_started", "timer_stopped", "timer_reset",
+                                 "settings_updated", "timer_finished"})
+
+# Bağlantı sağlığı
+# Tek bir heartbeat görevi HEARTBEAT_INTERVAL saniyede bir tüm bağlantıları dolaşır: sessiz kalanlara "ping" gönderir,
+# HEARTBEAT_TIMEOUT saniyedir hiçbir mesaj (pong dahil) göndermeyenleri ya da bir gönderimi SEND_STALL_TIMEOUT
+# saniyedir bitmeyenleri toplu olarak kapatır.
+HEARTBEAT_INTERVAL = float(os.environ.get("HEARTBEAT_INTERVAL", 15))
+HEARTBEAT_TIMEOUT = float(os.environ.get("HEARTBEAT_TIMEOUT", 45))
+SEND_STALL_TIMEOUT = float(os.environ.get("SEND_STALL_TIMEOUT", 30))
+# Gelen mesaj hız sınırı (bağlantı başına token bucket): saniyede INBOUND_RATE mesaj, en fazla INBOUND_BURST birikim.
+# Sınırı aşan mesajlar işlenmez; art arda INBOUND_BURST mesajı reddedilen bağlantı kapatılır. 0 = sınırsız.
+INBOUND_RATE = float(os.environ.get("INBOUND_RATE", 10))
+INBOUND_BURST = int(os.environ.get("INBOUND_BURST", 30))
+
+# Kalıcılık ayarları
+# PERSISTENCE=sqlite (varsayılan) oda durumlarını ve puanları DATABASE_PATH'e yazar; "none" kapatır
+PERSISTENCE_BACKEND = os.environ.get("PERSISTENCE", "sqlite")
+DATABASE_PATH = os.environ.get("DATABASE_PATH", str(BASE_DIR / "pomodoro.db"))
+PERSIST_FLUSH_INTERVAL = float(os.environ.get("PERSIST_FLUSH_INTERVAL", 2.0))
+# Oturum istatistikleri: tamamlanan her seans append-only bir günlüğe eklenir; gün/hafta/tüm zamanlar özetleri
+# aynı yazımda artımlı güncellenir, liderlik tabloları geçmiş taranmadan bu özetlerden sayfa sayfa okunur.
+STATS_PERIODS = ("day", "week", "all")
+STATS_PAGE_LIMIT = int(os.environ.get("STATS_PAGE_LIMIT", 500))
+
+# Worker'lar arası aktarım (backplane) ayarları
+# BACKPLANE=local tek süreç içindir; birden çok worker için "unix" (aynı makine) veya "redis" kullanılır
+BACKPLANE_BACKEND = os.environ.get("BACKPLANE", "local")
+BACKPLANE_SOCKET = os.environ.get("BACKPLANE_SOCKET", "/tmp/pomodoro-backplane.sock")
+BACKPLANE_URL = os.environ.get("BACKPLANE_URL", "redis://localhost:6379/0")
+
+# Boştaki oda tahliyesi
+# Son kullanıcı ayrıldıktan ROOM_IDLE_TTL saniye sonra oda bellekten atılır (durumu kalıcılık katmanında kalır).
+# Bellekteki oda sayısı MAX_ROOMS'u aşarsa en uzun süredir boş olan odalar önce atılır. 0 = sınırsız.
+ROOM_IDLE_TTL = float(os.environ.get("ROOM_IDLE_TTL", 600))
+MAX_ROOMS = int(os.environ.get("MAX_ROOMS", 10000))
+EVICTION_SWEEP_INTERVAL = float(os.environ.get("EVICTION_SWEEP_INTERVAL", 30))
+
+# Katılma/ayrılma bildirimleri oda başına bu pencere (sn) boyunca biriktirilip tek mesajla gönderilir.
+# 0 = biriktirme yok, her değişiklik hemen gönderilir.
+PRESENCE_WINDOW = float(os.environ.get("PRESENCE_WINDOW", 0.075))
+
+# İzleyici (spectator) bağlantıları katılımcı sayılmaz: presence ve puanlamaya girmez, komut gönderemez.
+# Odanın ayrı bir izleyici grubundan yalnızca sayaç durumunu alırlar; sayaç olayları oda başına en fazla
+# SPECTATOR_INTERVAL saniyede bir, o anki durumu taşıyan tek bir "timer_state" çerçevesiyle gönderilir.
+SPECTATOR_INTERVAL = float(os.environ.get("SPECTATOR_INTERVAL", 1.0))
+SPECTATOR_MESSAGE_TYPES = ("pong", "time_sync", "leave")
+
+# Genel (tüm odalar) liderlik tablosu: en iyi GLOBAL_LEADERBOARD_SIZE kullanıcı bellekte sıralı tutulur.
+# Abone bağlantılara sıra değişiklikleri GLOBAL_LEADERBOARD_WINDOW saniyelik pencerelerle toplu gönderilir.
+GLOBAL_LEADERBOARD_SIZE = int(os.environ.get("GLOBAL_LEADERBOARD_SIZE", 100))
+GLOBAL_LEADERBOARD_WINDOW = float(os.environ.get("GLOBAL_LEADERBOARD_WINDOW", 0.5))
+
+# Yeniden bağlanma
+# Bağlantısı kopan kullanıcının kaydı ve puanı RESUME_GRACE saniye tutulur. Katılımda aldığı resume_token ile
+# bu sürede dönen istemciye tam liste yerine yalnızca kaçırdığı delta mesajları (son RESUME_HISTORY tanesi) gönderilir.
+# İstemciye önerilen bekleme: [0, min(RECONNECT_MAX_DELAY, RECONNECT_BASE_DELAY * 2^deneme)] aralığında rastgele.
+RESUME_GRACE = float(os.environ.get("RESUME_GRACE", 30))
+RESUME_HISTORY = int(os.environ.get("RESUME_HISTORY", 256))
+RECONNECT_BASE_DELAY = float(os.environ.get("RECONNECT_BASE_DELAY", 1.0))
+RECONNECT_MAX_DELAY = float(os.environ.get("RECONNECT_MAX_DELAY", 30.0))
+
+
+# --- Metrikler ---
+
+class Counter:
+    """Artan sayaç"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+
+class Gauge:
+    """Anlık değer"""
+
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Histogram:
+    """
+    Sabit kovalı histogram. Kova sayıları önceden ayrılmış bir listede tutulur;
+    `observe` yalnızca bisect ve sayaç artırır.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # son eleman +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+
+class MetricsRegistry:
+    """
+    Prometheus metin biçiminde (/metrics) dışa aktarılan metrikler.
+    Etiketli metriklerin tüm çocukları kayıt anında oluşturulur; sıcak yolda yalnızca
+    sözlükten okunur, mesaj başına nesne oluşturulmaz. Bilinmeyen etiketler "other"a düşer.
+    """
+
+    def __init__(self):
+        self._families: list = []
+
+    def counter(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None) -> Counter:
+        """`fn` verilirse değer her okumada ondan alınır"""
+        metric = Counter()
+        self._families.append((name, "counter", help_text, None, {"": fn or metric}))
+        return metric
+
+    def counter_family(self, name: str, help_text: str, label: str, values) -> Dict[str, Counter]:
+        children = {value: Counter() for value in (*values, "other")}
+        self._families.append((name, "counter", help_text, label, children))
+        return children
+
+    def gauge(self, name: str, help_text: str, fn: Optional[Callable[[], float]] = None) -> Gauge:
+        """`fn` verilirse değer her okumada ondan alınır"""
+        metric = Gauge()
+        self._families.append((name, "gauge", help_text, None, {"": fn or metric}))
+        return metric
+
+    def histogram(self, name: str, help_text: str, buckets=LATENCY_BUCKETS) -> Histogram:
+        metric = Histogram(buckets)
+        self._families.append((name, "histogram", help_text, None, {"": metric}))
+        return metric
+
+    def histogram_family(self, name: str, help_text: str, label: str, values,
+                         buckets=LATENCY_BUCKETS) -> Dict[str, Histogram]:
+        children = {value: Histogram(buckets) for value in (*values, "other")}
+        self._families.append((name, "histogram", help_text, label, children))
+        return children
+
+    def render(self) -> str:
+        lines = []
+        for name, kind, help_text, label, children in self._families:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for label_value, metric in children.items():
+                labels = f'{label}="{label_value}"' if label else ""
+                if kind == "histogram":
+                    cumulative = 0
+                    for bound, count in zip((*metric.buckets, "+Inf"), metric.counts):
+                        cumulative += count
+                        le = f'le="{bound}"'
+                        lines.append(f"{name}_bucket{{{labels + ',' if labels else ''}{le}}} {cumulative}")
+                    suffix = f"{{{labels}}}" if labels else ""
+                    lines.append(f"{name}_sum{suffix} {metric.sum}")
+                    lines.append(f"{name}_count{suffix} {metric.count}")
+                else:
+                    value = metric() if callable(metric) else metric.value
+                    suffix = f"{{{labels}}}" if labels else ""
+                    lines.append(f"{name}{suffix} {value}")
+        lines.append("")
+        return "\n".join(lines)
+
+
+CLIENT_MESSAGE_TYPES = ("start_timer", "stop_timer", "reset_timer", "update_settings", "timer_completed", "pong",
+                        "time_sync", "subscribe_leaderboard", "unsubscribe_leaderboard")
+
+metrics = MetricsRegistry()
+CONNECTS = metrics.counter("pomodoro_connects_total", "Odaya katılan WebSocket bağlantıları")
+DISCONNECTS = metrics.counter("pomodoro_disconnects_total", "Odadan ayrılan WebSocket bağlantıları")
+RESUMES = metrics.counter("pomodoro_resumes_total", "resume_token ile geri alınan katılımcılar")
+BROADCASTS = metrics.counter("pomodoro_broadcasts_total", "Oda yayınları")
+FRAMES_ENQUEUED = metrics.counter("pomodoro_frames_enqueued_total", "Gönderim kuyruklarına eklenen çerçeveler")
+BROADCAST_SECONDS = metrics.histogram("pomodoro_broadcast_seconds", "Bir yayının kodlanıp kuyruklara dağıtılma süresi")
+SEND_FAILURES = metrics.counter("pomodoro_send_failures_total", "Hata ile sonuçlanan soket gönderimleri")
+SEND_DROPPED = metrics.counter("pomodoro_send_dropped_total", "Kuyruk dolduğu için atılan çerçeveler")
+HEARTBEAT_REAPED = metrics.counter("pomodoro_heartbeat_reaped_total",
+                                   "Yanıt vermediği ya da gönderimi takıldığı için kapatılan bağlantılar")
+INBOUND_LIMITED = metrics.counter("pomodoro_inbound_rate_limited_total", "Hız sınırı nedeniyle işlenmeyen istemci mesajları")
+MESSAGES = metrics.counter_family("pomodoro_messages_total", "İşlenen istemci mesajları", "type",
+                                  CLIENT_MESSAGE_TYPES)
+MESSAGE_SECONDS = metrics.histogram_family("pomodoro_message_seconds", "İstemci mesajı işleme süresi", "type",
+                                           CLIENT_MESSAGE_TYPES)
+ROOM_COMMAND_BATCH = metrics.histogram("pomodoro_room_command_batch_size",
+                                       "Oda aktörünün bir turda işlediği komut sayısı",
+                                       buckets=(1, 2, 5, 10, 25, 50, 100, 250, 1000))
+EVENT_LOOP_LAG = metrics.gauge("pomodoro_event_loop_lag_seconds", "Event loop gecikmesi (son ölçüm)")
+LOOP_LAG_INTERVAL = float(os.environ.get("LOOP_LAG_INTERVAL", 0.5))
+
+
+async def monitor_event_loop_lag(interval: float = LOOP_LAG_INTERVAL):
+    """Uyanma gecikmesini ölçerek event loop'un ne kadar tıkandığını izler"""
+    loop = asyncio.get_running_loop()
+    while True:
+        expected = loop.time() + interval
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.set(max(0.0, loop.time() - expected))
+
+
+def _stdlib_dumps(message: dict) -> str:
+    return json.dumps(message, ensure_ascii=False, separators=(",", ":"))
+
+
+def _orjson_dumps(message: dict) -> str:
+    return orjson.dumps(message).decode("utf-8")
+
+
+# Mesaj kodlayıcı: bir dict'i WebSocket metin çerçevesine çevirir.
+# Farklı bir kodlayıcı kullanmak için set_json_encoder() çağrılabilir.
+json_encoder: Callable[[dict], str] = _orjson_dumps if orjson is not None else _stdlib_dumps
+
+
+def set_json_encoder(encoder: Callable[[dict], str]):
+    """Yayınlarda kullanılan JSON kodlayıcıyı değiştirir"""
+    global json_encoder
+    json_encoder = encoder
+
+
+class Frame:
+    """
+    Bir kez kodlanmış, tüm alıcılara aynen gönderilen mesaj.
+    `type` alanı kuyruktaki birleştirme (coalesce) için saklanır;
+    `droppable` False ise mesaj kuyruk dolsa bile atılamaz.
+    `binary` ikili kodlamalı bir alıcı ilk kez gönderdiğinde `message`'tan üretilir ve sonra paylaşılır.
+    """
+
+    __slots__ = ("type", "data", "droppable", "message", "binary", "size")
+
+    def __init__(self, message_type: Optional[str], data: str, droppable: bool = True,
+                 message: Optional[dict] = None):
+        self.type = message_type
+        self.data = data
+        self.droppable = droppable
+        self.message = message
+        self.binary: Optional[bytes] = None
+        self.size = len(data)
+
+
+def encode_frame(message: dict) -> Frame:
+    """Mesajı tek seferde kodlar"""
+    message_type = message.get("type")
+    return Frame(message_type, json_encoder(message), message_type not in UNDROPPABLE_MESSAGE_TYPES, message)
+
+
+# --- İkili (MessagePack) kodlama ---
+# İstemci WebSocket alt protokolü olarak BINARY_SUBPROTOCOL isterse (ve msgpack kuruluysa) mesajlar ikili
+# çerçeve olarak gider: mesaj türleri ve alan adları sayı koduna, ISO zaman damgaları epoch milisaniyeye çevrilir.
+# Varsayılan JSON'dur. Kodlar yalnızca sona eklenerek genişletilir; tablo /protocol adresinden okunabilir.
+BINARY_SUBPROTOCOL = "pomodoro.msgpack"
+MESSAGE_TYPE_CODES = {name: code for code, name in enumerate((
+    "session", "timer_state", "timer_started", "timer_stopped", "timer_reset", "settings_updated",
+    "timer_finished", "user_list_update", "presence", "rank_changed",
+    "connect", "start_timer", "stop_timer", "reset_timer", "update_settings", "timer_completed", "leave",
+    "ping", "pong", "time_sync",
+    "leaderboard", "leaderboard_changed", "subscribe_leaderboard", "unsubscribe_leaderboard",
+))}
+FIELD_CODES = {name: code for code, name in enumerate((
+    "type", "remaining_seconds", "is_running", "target_timestamp", "mode", "settings",
+    "work_duration", "short_break", "long_break", "users", "name", "id", "total_seconds",
+    "user", "rank", "added", "removed", "joined", "left", "changes", "seq",
+    "participant_id", "resume_token", "resumed", "resume_grace", "reconnect", "base_ms", "max_ms",
+    "user_name", "last_seq", "ends_at", "t0", "t1", "t2",
+    "entries", "limit", "size",
+))}
+TIMESTAMP_FIELDS = frozenset({"target_timestamp"})
+_MESSAGE_TYPE_NAMES = {code: name for name, code in MESSAGE_TYPE_CODES.items()}
+_FIELD_NAMES = {code: name for name, code in FIELD_CODES.items()}
+_field_code = FIELD_CODES.get
+_SCALAR_TYPES = frozenset({str, int, float, bool, type(None)})
+
+
+def to_binary_message(value):
+    """Mesajı ikili kodlamanın sayı kodlu biçimine çevirir (bilinmeyen alanlar olduğu gibi kalır)"""
+    if isinstance(value, list):
+        return [item if type(item) in _SCALAR_TYPES else to_binary_message(item) for item in value]
+    if not isinstance(value, dict):
+        return value
+    compact = {}
+    for key, item in value.items():
+        if type(item) not in _SCALAR_TYPES:
+            item = to_binary_message(item)
+        elif key == "type":
+            item = MESSAGE_TYPE_CODES.get(item, item)
+        elif key in TIMESTAMP_FIELDS and isinstance(item, str):
+            item = int(datetime.fromisoformat(item).timestamp() * 1000)
+        compact[_field_code(key, key)] = item
+    return compact
+
+
+def from_binary_message(value):
+    """İstemciden gelen sayı kodlu mesajı alan adlı biçime çevirir"""
+    if isinstance(value, dict):
+        expanded = {}
+        for key, item in value.items():
+            key = _FIELD_NAMES.get(key, key)
+            if key == "type":
+                item = _MESSAGE_TYPE_NAMES.get(item, item)
+            else:
+                item = from_binary_message(item)
+            expanded[key] = item
+        return expanded
+    if isinstance(value, list):
+        return [from_binary_message(item) for item in value]
+    return value
+
+
+class MessageCodec:
+    """Bir bağlantının mesaj kodlaması. Varsayılan: JSON metin çerçeveleri."""
+
+    name = "json"
+    subprotocol: Optional[str] = None
+
+    async def send(self, websocket: WebSocket, frame: Frame):
+        await websocket.send_text(frame.data)
+
+    async def receive(self, websocket: WebSocket) -> dict:
+        return await websocket.receive_json()
+
+
+class MsgpackCodec(MessageCodec):
+    """MessagePack ikili çerçeveleri; çerçeve başına bir kez kodlanır ve paylaşılır"""
+
+    name = "msgpack"
+    subprotocol = BINARY_SUBPROTOCOL
+
+    async def send(self, websocket: WebSocket, frame: Frame):
+        if frame.binary is None:
+            frame.binary = msgpack.packb(to_binary_message(frame.message), use_bin_type=True)
+        await websocket.send_bytes(frame.binary)
+
+    async def receive(self, websocket: WebSocket) -> dict:
+        data = msgpack.unpackb(await websocket.receive_bytes(), raw=False, strict_map_key=False)
+        if not isinstance(data, dict):
+            raise ValueError("Geçersiz mesaj")
+        return from_binary_message(data)
+
+
+JSON_CODEC = MessageCodec()
+# Alt protokol adı -> kodlama; msgpack kurulu değilse yalnızca JSON sunulur
+CODECS: Dict[str, MessageCodec] = {BINARY_SUBPROTOCOL: MsgpackCodec()} if msgpack is not None else {}
+
+
+def negotiate_codec(websocket: WebSocket) -> MessageCodec:
+    """İstemcinin önerdiği alt protokollerden desteklenen ilkini seçer; yoksa JSON"""
+    for protocol in websocket.scope.get("subprotocols") or ():
+        codec = CODECS.get(protocol)
+        if codec is not None:
+            return codec
+    return JSON_CODEC
+
+
+class ClientConnection:
+    """
+    Tek bir WebSocket için sınırlı gönderim kuyruğu ve onu boşaltan yazıcı görev.
+    Yayınlar kuyruğa ekleyip hemen döner; yavaş bir istemci odadaki diğerlerini bekletmez.
+    Heartbeat için son gelen mesajın ve süren gönderimin zamanını (monotonic) tutar.
+    """
+
+    __slots__ = ("websocket", "participant", "codec", "queue", "max_size", "max_bytes", "buffered",
+                 "policy", "on_error", "closed", "dropped", "last_seen", "send_started",
+                 "rate_limited", "_tokens", "_refilled_at", "_wakeup", "_writer")
+
+    def __init__(self, websocket: WebSocket, participant: "Participant",
+                 on_error: Optional[Callable[["ClientConnection"], None]] = None,
+                 max_size: int = SEND_QUEUE_SIZE, policy: str = SLOW_CONSUMER_POLICY,
+                 codec: MessageCodec = JSON_CODEC, max_bytes: int = SEND_BUFFER_BYTES):
+        if policy not in SLOW_CONSUMER_POLICIES:
+            raise ValueError(f"Bilinmeyen yavaş istemci politikası: {policy}")
+        self.websocket = websocket
+        self.participant = participant
+        self.codec = codec
+        self.queue: Deque[Frame] = deque()
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.buffered = 0
+        self.policy = policy
+        self.on_error = on_error
+        self.closed = False
+        self.dropped = 0
+        self.last_seen = time.monotonic()
+        self.send_started: Optional[float] = None
+        self.rate_limited = 0
+        self._tokens = float(INBOUND_BURST)
+        self._refilled_at = self.last_seen
+        self._wakeup = asyncio.Event()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    def enqueue(self, frame: Frame) -> bool:
+        """Çerçeveyi kuyruğa ekler (beklemeden). Çerçeve kabul edildiyse True döner."""
+        if self.closed:
+            return False
+
+        # Tek başına sınırı aşan çerçeve boş kuyruğa yine de girer; aksi halde hiç gönderilemezdi
+        while self.queue and (len(self.queue) >= self.max_size or self.buffered + frame.size > self.max_bytes):
+            if self.policy == "disconnect":
+                logger.warning("Yavaş istemci bağlantısı kesiliyor")
+                self._fail(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            if self.policy == "drop" and frame.droppable:
+                self.dropped += 1
+                SEND_DROPPED.inc()
+                return False
+            if not self._evict(frame):
+                logger.warning("Yavaş istemci delta mesajlarını alamıyor, bağlantı kesiliyor")
+                self._fail(SLOW_CONSUMER_CLOSE_CODE)
+                return False
+            self.dropped += 1
+            SEND_DROPPED.inc()
+
+        self.queue.append(frame)
+        self.buffered += frame.size
+        self._wakeup.set()
+        return True
+
+    def has_room_for(self, frames: List[Frame]) -> bool:
+        """Çerçevelerin hiçbir şey atılmadan kuyruğa sığıp sığmayacağı"""
+        return (len(self.queue) + len(frames) <= self.max_size
+                and self.buffered + sum(frame.size for frame in frames) <= self.max_bytes)
+
+    def allow_inbound(self, now: float) -> bool:
+        """Gelen mesajı kaydeder; hız sınırı aşıldıysa False döner (token bucket)"""
+        self.last_seen = now
+        if INBOUND_RATE <= 0:
+            return True
+        tokens = min(float(INBOUND_BURST), self._tokens + (now - self._refilled_at) * INBOUND_RATE)
+        self._refilled_at = now
+        if tokens < 1:
+            self._tokens = tokens
+            self.rate_limited += 1
+            return False
+        self._tokens = tokens - 1
+        self.rate_limited = 0
+        return True
+
+    def _evict(self, frame: Frame) -> bool:
+        """Yer açmak için atılabilir bir çerçeveyi kuyruktan çıkarır"""
+        if self.policy == "coalesce" and frame.droppable:
+            # Aynı türdeki bekleyen mesaj artık eskidi
+            for index, pending in enumerate(self.queue):
+                if pending.type == frame.type:
+                    del self.queue[index]
+                    self.buffered -= pending.size
+                    return True
+        for index, pending in enumerate(self.queue):
+            if pending.droppable:
+                del self.queue[index]
+                self.buffered -= pending.size
+                return True
+        return False
+
+    async def _write_loop(self):
+        try:
+            while True:
+                while not self.queue:
+                    self._wakeup.clear()
+                    await self._wakeup.wait()
+                frame = self.queue.popleft()
+                self.buffered -= frame.size
+                self.send_started = time.monotonic()
+                await self.codec.send(self.websocket, frame)
+                self.send_started = None
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Yayın hatası: {e}")
+            SEND_FAILURES.inc()
+            self._fail()
+
+    def _fail(self, close_code: Optional[int] = None):
+        if self.closed:
+            return
+        self.close()
+        if close_code is not None:
+            # Yalnızca kuyruğu kapatmak yetmez: soket açık kalırsa istemci hiçbir şey almadan bekler
+            asyncio.create_task(self._close_socket(close_code))
+        if self.on_error:
+            self.on_error(self)
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+    def close(self):
+        """Kuyruğu boşaltır ve yazıcı görevi durdurur."""
+        if self.closed:
+            return
+        self.closed = True
+        self.queue.clear()
+        self.buffered = 0
+        if self._writer is not asyncio.current_task():
+            self._writer.cancel()
+
+
+class TimerScheduler:
+    """
+    Tüm odaların bitiş zamanlarını tek bir asyncio görevinde yöneten zamanlayıcı.
+    Bitiş zamanları bir min-heap'te tutulur; oda başına görev açılmaz.
+    İptal edilen/güncellenen kayıtlar heap'ten silinmez, sırası gelince atlanır.
+    """
+
+    def __init__(self, on_deadline: Callable[[str], "asyncio.Future"]):
+        self.on_deadline = on_deadline
+        self._heap: list = []
+        self._deadlines: Dict[str, float] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def schedule(self, room_id: str, deadline: float):
+        """Odanın bitişini `deadline` (epoch saniye) anına kurar; önceki kaydın yerine geçer"""
+        self._deadlines[room_id] = deadline
+        heapq.heappush(self._heap, (deadline, room_id))
+        self._ensure_running()
+        # Yeni kayıt en erkense uyuyan görevi uyandır
+        if self._heap[0][1] == room_id:
+            self._wakeup.set()
+
+    def cancel(self, room_id: str):
+        """Odanın bekleyen bitişini iptal eder"""
+        if self._deadlines.pop(room_id, None) is None:
+            return
+        # Geçersiz kayıtlar birikirse heap'i sıkıştır
+        if len(self._heap) > 64 and len(self._heap) > 2 * len(self._deadlines):
+            self._heap = [(d, r) for d, r in self._heap if self._deadlines.get(r) == d]
+            heapq.heapify(self._heap)
+
+    def deadline(self, room_id: str) -> Optional[float]:
+        return self._deadlines.get(room_id)
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            now = time.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now:
+                deadline, room_id = heapq.heappop(self._heap)
+                if self._deadlines.get(room_id) == deadline:
+                    del self._deadlines[room_id]
+                    due.append(room_id)
+
+            for room_id in due:
+                try:
+                    await self.on_deadline(room_id)
+                except Exception as e:
+                    logger.error(f"Zamanlayıcı hatası ({room_id}): {e}")
+
+            if due:
+                continue
+
+            timeout = self._heap[0][0] - now if self._heap else None
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+def format_timestamp(ts: Optional[float]) -> Optional[str]:
+    """Epoch saniyeyi istemcilerin beklediği ISO-8601 (UTC) metne çevirir"""
+    if ts is None:
+        return None
+    return datetime.fromtimestamp(ts, timezone.utc).isoformat()
+
+
+# Sunucu saati: sürecin monotonic saati (ms). İstemciler "time_sync" ile bu saate göre ofsetlerini ölçer;
+# sayaç mesajlarındaki "ends_at" aynı saattedir, böylece cihaz saatinin kayması bitiş anını etkilemez.
+_SERVER_CLOCK_ORIGIN = time.monotonic()
+
+
+def server_now_ms() -> int:
+    return int((time.monotonic() - _SERVER_CLOCK_ORIGIN) * 1000)
+
+
+def server_deadline_ms(target_timestamp: Optional[float]) -> Optional[int]:
+    """Epoch bitiş zamanını bu sürecin sunucu saatine (ms) çevirir"""
+    if target_timestamp is None:
+        return None
+    return server_now_ms() + int((target_timestamp - time.time()) * 1000)
+
+
+class RoomSettings:
+    """Odanın süre ayarları (saniye cinsinden)"""
+
+    __slots__ = ("work_duration", "short_break", "long_break")
+
+    def __init__(self, work_duration: int = DEFAULT_WORK_DURATION,
+                 short_break: int = DEFAULT_SHORT_BREAK, long_break: int = DEFAULT_LONG_BREAK):
+        self.work_duration = work_duration
+        self.short_break = short_break
+        self.long_break = long_break
+
+    def duration_for(self, mode: str) -> int:
+        """Moda karşılık gelen süre; bilinmeyen modlarda çalışma süresi"""
+        if mode == "short_break":
+            return self.short_break
+        if mode == "long_break":
+            return self.long_break
+        return self.work_duration
+
+    def to_dict(self) -> dict:
+        return {
+            "work_duration": self.work_duration,
+            "short_break": self.short_break,
+            "long_break": self.long_break
+        }
+
+
+def valid_duration(value, fallback: int) -> int:
+    """Pozitif tam sayı süreyi döner; değilse (null, ondalıklı, metin, bool) `fallback`"""
+    if isinstance(value, int) and not isinstance(value, bool) and value > 0:
+        return value
+    return fallback
+
+
+class TimerState:
+    """
+    Odanın sayaç durumu.
+    `target_timestamp` epoch saniye olarak tutulur; ISO metne yalnızca mesaj gönderilirken çevrilir.
+    """
+
+    __slots__ = ("remaining_seconds", "is_running", "target_timestamp", "mode")
+
+    def __init__(self, remaining_seconds: int = DEFAULT_WORK_DURATION, mode: str = "work"):
+        self.remaining_seconds = remaining_seconds
+        self.is_running = False
+        self.target_timestamp: Optional[float] = None
+        self.mode = mode
+
+    def remaining_at(self, now: float) -> int:
+        """`now` anında kalan süre (saniye)"""
+        if self.is_running and self.target_timestamp is not None:
+            return max(0, int(self.target_timestamp - now))
+        return self.remaining_seconds
+
+
+class Participant:
+    """
+    Odadaki bir kullanıcı. Zamanlar epoch saniye olarak tutulur.
+    `remote` kullanıcılar başka bir worker'a bağlıdır; puanlarını o worker hesaplar.
+    Odaya eklenen kullanıcının puanı ve oturum başlangıcı odanın sütunlarında (ParticipantColumns) durur.
+    """
+
+    __slots__ = ("id", "name", "joined_at", "remote", "resume_token",
+                 "_columns", "_slot", "_total_seconds", "_session_start")
+
+    def __init__(self, name: str, participant_id: Optional[str] = None,
+                 joined_at: Optional[float] = None, total_seconds: int = 0, remote: bool = False):
+        self.id = participant_id or str(uuid.uuid4())
+        self.name = name
+        self.joined_at = joined_at if joined_at is not None else time.time()
+        self.remote = remote
+        self.resume_token: Optional[str] = None
+        self._columns: Optional["ParticipantColumns"] = None
+        self._slot = -1
+        self._total_seconds = total_seconds  # Toplam puan (saniye cinsinden)
+        self._session_start: Optional[float] = None
+
+    @property
+    def total_seconds(self) -> int:
+        if self._columns is None:
+            return self._total_seconds
+        return self._columns.get_total(self._slot)
+
+    @total_seconds.setter
+    def total_seconds(self, value: int):
+        if self._columns is None:
+            self._total_seconds = value
+        else:
+            self._columns.set_total(self._slot, value)
+
+    @property
+    def current_session_start(self) -> Optional[float]:
+        if self._columns is None:
+            return self._session_start
+        return self._columns.get_start(self._slot)
+
+    @current_session_start.setter
+    def current_session_start(self, value: Optional[float]):
+        if self._columns is None:
+            self._session_start = value
+        else:
+            self._columns.set_start(self._slot, value)
+
+    def to_public(self) -> dict:
+        """Frontend'e gönderilen kullanıcı bilgisi"""
+        return {"name": self.name, "id": self.id, "total_seconds": self.total_seconds}
+
+    def to_event(self) -> dict:
+        """Diğer worker'lara gönderilen kullanıcı bilgisi"""
+        return {"name": self.name, "id": self.id, "total_seconds": self.total_seconds,
+                "joined_at": self.joined_at}
+
+
+class ParticipantColumns:
+    """
+    Odadaki kullanıcıların sayısal verisi sütunlarda: oturum başlangıcı (epoch float, NaN = yok),
+    toplam puan (int) ve bu worker'a bağlı olma bayrağı. Kullanıcı yalnızca kendi satır numarasını bilir;
+    satırlar sıkışık tutulur (çıkan kullanıcının yerine son satır taşınır).
+    Başlatma/durdurma/bitirme kullanıcı nesnelerine tek tek dokunmadan sütun üzerinde yapılır.
+    Bu sınıf array modülünü kullanır; NumPy kuruluysa NumpyParticipantColumns vektörel işlem yapar.
+    """
+
+    __slots__ = ("members", "starts", "totals", "local", "remote_count")
+
+    def __init__(self):
+        self.members: List[Participant] = []
+        self.starts = array("d")
+        self.totals = array("q")
+        self.local = array("b")
+        self.remote_count = 0
+
+    def __len__(self):
+        return len(self.members)
+
+    def attach(self, participant: Participant):
+        start = participant._session_start
+        self._append(math.nan if start is None else start, participant._total_seconds, not participant.remote)
+        participant._slot = len(self.members)
+        participant._columns = self
+        self.members.append(participant)
+        self.remote_count += participant.remote
+
+    def detach(self, participant: Participant):
+        slot = participant._slot
+        self.remote_count -= not self.local[slot]
+        participant._total_seconds = self.get_total(slot)
+        participant._session_start = self.get_start(slot)
+        participant._columns = None
+        participant._slot = -1
+        last = len(self.members) - 1
+        if slot != last:
+            moved = self.members[last]
+            self.members[slot] = moved
+            moved._slot = slot
+            self._move(last, slot)
+        self.members.pop()
+        self._truncate(last)
+
+    def _append(self, start: float, total: int, local: bool):
+        self.starts.append(start)
+        self.totals.append(total)
+        self.local.append(local)
+
+    def _move(self, source: int, target: int):
+        self.starts[target] = self.starts[source]
+        self.totals[target] = self.totals[source]
+        self.local[target] = self.local[source]
+
+    def _truncate(self, size: int):
+        del self.starts[size:]
+        del self.totals[size:]
+        del self.local[size:]
+
+    def get_start(self, slot: int) -> Optional[float]:
+        start = self.starts[slot]
+        return None if start != start else float(start)
+
+    def set_start(self, slot: int, value: Optional[float]):
+        self.starts[slot] = math.nan if value is None else value
+
+    def get_total(self, slot: int) -> int:
+        return int(self.totals[slot])
+
+    def set_total(self, slot: int, value: int):
+        self.totals[slot] = value
+
+    def set_local(self, slot: int, local: bool):
+        """Satırın bu worker'da puanlanıp puanlanmadığını değiştirir (bkz. Room.set_away)"""
+        if bool(self.local[slot]) != local:
+            self.local[slot] = local
+            self.remote_count += -1 if local else 1
+
+    def set_session_starts(self, ts: Optional[float], only_missing: bool = False):
+        """Bu worker'a bağlı herkesin (only_missing ise yalnızca oturumu olmayanların) başlangıcını ayarlar"""
+        value = math.nan if ts is None else ts
+        size = len(self.members)
+        if not self.remote_count and not only_missing:
+            self.starts = array("d", [value]) * size
+            return
+        starts, local = self.starts, self.local
+        for slot in range(size):
+            if local[slot] and (not only_missing or starts[slot] != starts[slot]):
+                starts[slot] = value
+
+    def finish(self, now: float, max_duration: int) -> List[Tuple[Participant, int, float]]:
+        """
+        Tüm oturumları kapatır; içeride kalınan süreyi (en fazla `max_duration`) puanlara ekler.
+        Puan alanları [(kullanıcı, kazanılan saniye, oturum başlangıcı), ...] olarak döner.
+        """
+        starts = self.starts
+        # NaN (oturum yok) her iki karşılaştırmada da False olduğundan 0 kazanır; min/max çağrısı yapılmaz
+        earned = [max_duration if now - start >= max_duration else (int(now - start) if now > start else 0)
+                  for start in starts]
+        self.totals = array("q", map(operator.add, self.totals, earned))
+        self.starts = array("d", [math.nan]) * len(starts)
+        return [reward for reward in zip(self.members, earned, starts) if reward[1]]
+
+
+class NumpyParticipantColumns(ParticipantColumns):
+    """ParticipantColumns'un NumPy sürümü: sütunlar kapasitesi ikiye katlanarak büyüyen dizilerdir"""
+
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__()
+        self.starts = numpy.empty(0, dtype=numpy.float64)
+        self.totals = numpy.empty(0, dtype=numpy.int64)
+        self.local = numpy.empty(0, dtype=bool)
+
+    def _append(self, start: float, total: int, local: bool):
+        size = len(self.members)
+        if size == len(self.starts):
+            capacity = max(8, size * 2)
+            self.starts = numpy.resize(self.starts, capacity)
+            self.totals = numpy.resize(self.totals, capacity)
+            self.local = numpy.resize(self.local, capacity)
+        self.starts[size] = start
+        self.totals[size] = total
+        self.local[size] = local
+
+    def _truncate(self, size: int):
+        # Kapasite korunur; `size` sonrası satırlar kullanılmaz
+        pass
+
+    def set_session_starts(self, ts: Optional[float], only_missing: bool = False):
+        value = math.nan if ts is None else ts
+        size = len(self.members)
+        starts = self.starts[:size]
+        if not self.remote_count and not only_missing:
+            starts.fill(value)
+            return
+        mask = self.local[:size]
+        if only_missing:
+            mask = mask & numpy.isnan(starts)
+        starts[mask] = value
+
+    def finish(self, now: float, max_duration: int) -> List[Tuple[Participant, int, float]]:
+        size = len(self.members)
+        starts = self.starts[:size]
+        slots = numpy.flatnonzero(~numpy.isnan(starts))
+        earned = numpy.clip(numpy.trunc(now - starts[slots]), 0, max_duration).astype(numpy.int64)
+        scored = earned > 0
+        slots, earned = slots[scored], earned[scored]
+        self.totals[slots] += earned
+        if len(slots) == size:
+            # Herkes puan aldı (olağan durum): satır seçimi gerekmez
+            members = self.members
+        else:
+            members = [self.members[slot] for slot in slots.tolist()]
+        rewarded = list(zip(members, earned.tolist(), starts[slots].tolist()))
+        starts.fill(math.nan)
+        return rewarded
+
+
+# Yeni odalar için sütun uygulaması (NumPy kuruluysa vektörel)
+participant_columns_class = NumpyParticipantColumns if numpy is not None else ParticipantColumns
+
+
+class RankedIndex:
+    """
+    Odadaki kullanıcıların puana göre sıralı indeksi.
+    Anahtar (-total_seconds, joined_at, id) olduğundan eşit puanlarda önce katılan önde kalır.
+    Yalnızca puanı değişen kullanıcılar yeniden yerleştirilir; her değişiklikte tüm liste sıralanmaz.
+    """
+
+    __slots__ = ("_keys", "_key_by_id")
+
+    def __init__(self):
+        self._keys: list = []
+        self._key_by_id: Dict[str, tuple] = {}
+
+    def __len__(self):
+        return len(self._keys)
+
+    @staticmethod
+    def _key(participant: Participant) -> tuple:
+        return (-participant.total_seconds, participant.joined_at, participant.id)
+
+    def add(self, participant: Participant) -> int:
+        """Kullanıcıyı ekler ve sırasını (0 tabanlı) döner"""
+        key = self._key(participant)
+        self._key_by_id[participant.id] = key
+        index = bisect.bisect_left(self._keys, key)
+        self._keys.insert(index, key)
+        return index
+
+    def remove(self, participant_id: str):
+        key = self._key_by_id.pop(participant_id, None)
+        if key is None:
+            return
+        index = bisect.bisect_left(self._keys, key)
+        del self._keys[index]
+
+    def update(self, participants: List[Participant]) -> List[dict]:
+        """
+        Puanı değişmiş kullanıcıları yeniden yerleştirir.
+        İstemcinin uygulayabileceği {"id", "total_seconds", "rank"} değişikliklerini döner.
+        """
+        changed = [p for p in participants if self._key_by_id.get(p.id) != self._key(p)]
+        if not changed:
+            return []
+
+        if len(changed) * 4 > len(self._keys):
+            # Çoğu kullanıcı değiştiyse tek seferde yeniden sıralamak daha ucuz
+            for participant in changed:
+                self._key_by_id[participant.id] = self._key(participant)
+            self._keys = sorted(self._key_by_id.values())
+        else:
+            for participant in changed:
+                self.remove(participant.id)
+                self.add(participant)
+
+        return sorted(
+            (
+                {
+                    "id": participant.id,
+                    "total_seconds": participant.total_seconds,
+                    "rank": bisect.bisect_left(self._keys, self._key_by_id[participant.id])
+                }
+                for participant in changed
+            ),
+            key=lambda change: change["rank"]
+        )
+
+    def rank_of(self, participant_id: str) -> Optional[int]:
+        key = self._key_by_id.get(participant_id)
+        if key is None:
+            return None
+        return bisect.bisect_left(self._keys, key)
+
+    def ordered_ids(self) -> List[str]:
+        return [key[2] for key in self._keys]
+
+
+class GlobalLeaderboard:
+    """
+    Tüm odalar ve worker'lar genelinde isim -> toplam puan ile en iyi `size` kullanıcının sıralı listesi.
+    Puanlar yalnızca artar: listeye yalnızca puanı artan kullanıcı girebilir ve giren her kullanıcı sonuncuyu
+    dışarı iter. Güncelleme bisect ile yapılır; okumalar odaları taramadan bu listeden yanıtlanır.
+    Sıralar (rank) 1'den başlar.
+    """
+
+    __slots__ = ("size", "totals", "_keys")
+
+    def __init__(self, size: int = GLOBAL_LEADERBOARD_SIZE):
+        self.size = size
+        self.totals: Dict[str, int] = {}
+        self._keys: list = []  # (-total_seconds, name), sıralı
+
+    def __len__(self):
+        return len(self._keys)
+
+    def load(self, rows: List[tuple]):
+        """Kalıcılık katmanındaki toplamlarla başlatır: [(name, total_seconds), ...]"""
+        for name, total_seconds in rows:
+            self.totals[name] = total_seconds
+        self._keys = heapq.nsmallest(max(0, self.size), ((-total, name) for name, total in self.totals.items()))
+
+    def add(self, earned: Dict[str, int]) -> List[str]:
+        """Kazanılan puanları ekler; listede yeri değişen ya da listeden düşen isimleri döner"""
+        changed = []
+        for name, seconds in earned.items():
+            if seconds <= 0:
+                continue
+            old_total = self.totals.get(name, 0)
+            total = self.totals[name] = old_total + seconds
+            if self.size <= 0:
+                continue
+            old_key = (-old_total, name)
+            index = bisect.bisect_left(self._keys, old_key)
+            if index < len(self._keys) and self._keys[index] == old_key:
+                del self._keys[index]
+            elif len(self._keys) >= self.size and (-total, name) > self._keys[-1]:
+                continue
+            bisect.insort(self._keys, (-total, name))
+            changed.append(name)
+            if len(self._keys) > self.size:
+                changed.append(self._keys.pop()[1])
+        return changed
+
+    def rank_of(self, name: str) -> Optional[int]:
+        total = self.totals.get(name)
+        if total is None:
+            return None
+        key = (-total, name)
+        index = bisect.bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return index + 1
+        return None
+
+    def entries(self, offset: int = 0, limit: Optional[int] = None) -> List[dict]:
+        end = len(self._keys) if limit is None else offset + limit
+        return [
+            {"rank": rank, "name": name, "total_seconds": -negative_total}
+            for rank, (negative_total, name) in enumerate(self._keys[offset:end], start=offset + 1)
+        ]
+
+    def changes(self, names) -> List[dict]:
+        """İstemcinin uygulayabileceği {"name", "total_seconds", "rank"} değişiklikleri; listeden düşenlerde rank None"""
+        changes = [
+            {"name": name, "total_seconds": self.totals.get(name, 0), "rank": self.rank_of(name)}
+            for name in set(names)
+        ]
+        changes.sort(key=lambda change: (change["rank"] is None, change["rank"] or 0, change["name"]))
+        return changes
+
+
+class Room:
+    """
+    Bir odanın durumu: sayaç, ayarlar ve id ile indekslenmiş kullanıcılar.
+    `scores` odadan ayrılanlar dahil isim -> toplam puan kaydıdır; aynı isimle dönen kullanıcı puanını geri alır
+    (ilk puanla oluşturulur; `score_of`/`set_score` ile erişilir).
+    `seq` odanın son delta mesajının numarasıdır; `history` yeniden bağlananlar için son delta çerçevelerini tutar.
+    """
+
+    __slots__ = ("room_id", "timer", "settings", "users", "columns", "ranking", "scores", "seq", "history")
+
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.settings = RoomSettings()
+        self.timer = TimerState(self.settings.work_duration)
+        self.users: Dict[str, Participant] = {}
+        # Sütunlar ve sıralama ilk kullanıcıyla oluşturulur; boş odalar bellekte yer kaplamasın
+        self.columns: Optional[ParticipantColumns] = None
+        self.ranking: Optional[RankedIndex] = None
+        self.scores: Optional[Dict[str, int]] = None
+        self.seq = 0
+        self.history: Optional[Deque[Tuple[int, Frame]]] = None
+
+    def add_user(self, participant: Participant) -> int:
+        """Kullanıcıyı ekler ve liderlik tablosundaki sırasını döner"""
+        self.users[participant.id] = participant
+        if self.columns is None:
+            self.columns = participant_columns_class()
+        if self.ranking is None:
+            self.ranking = RankedIndex()
+        self.columns.attach(participant)
+        return self.ranking.add(participant)
+
+    def remove_user(self, participant_id: str) -> Optional[Participant]:
+        participant = self.users.pop(participant_id, None)
+        if participant is not None:
+            self.ranking.remove(participant_id)
+            self.columns.detach(participant)
+            if not self.users:
+                self.columns = None
+                self.ranking = None
+        return participant
+
+    def rank_of(self, participant_id: str) -> Optional[int]:
+        return self.ranking.rank_of(participant_id) if self.ranking is not None else None
+
+    def update_ranks(self, participants: List[Participant]) -> List[dict]:
+        """Puanı değişen kullanıcıları yeniden sıralar; bkz. RankedIndex.update"""
+        if self.ranking is None:
+            return []
+        return self.ranking.update(participants)
+
+    def score_of(self, user_name: str) -> int:
+        return self.scores.get(user_name, 0) if self.scores is not None else 0
+
+    def set_score(self, user_name: str, total_seconds: int, keep_existing: bool = False):
+        """Kullanıcının puan kaydını yazar; keep_existing ise bellekte olan kayıt korunur"""
+        if self.scores is None:
+            self.scores = {}
+        if keep_existing:
+            self.scores.setdefault(user_name, total_seconds)
+        else:
+            self.scores[user_name] = total_seconds
+
+    def record_delta(self, frame: Frame):
+        if self.history is None:
+            self.history = deque(maxlen=RESUME_HISTORY)
+        self.history.append((self.seq, frame))
+
+    def deltas_since(self, seq: int) -> Optional[List[Frame]]:
+        """`seq`'ten sonraki delta çerçeveleri; geçmiş yetmiyorsa None (istemci tam listeyi almalı)"""
+        if seq == self.seq:
+            return []
+        if seq > self.seq or not self.history or self.history[0][0] > seq + 1:
+            return None
+        return [frame for frame_seq, frame in self.history if frame_seq > seq]
+
+    def leaderboard(self) -> List[dict]:
+        """Puana göre sıralı tam kullanıcı listesi"""
+        if self.ranking is None:
+            return []
+        users = self.users
+        return [users[user_id].to_public() for user_id in self.ranking.ordered_ids()]
+
+    def set_away(self, participant: Participant, away: bool) -> bool:
+        """
+        Kopan ama geri dönebilecek kullanıcı listede kalır, puan almaz: oturumu kapatılır ve
+        sayaç başlatmaları onu atlar. `away` False ise yeniden bu worker'da puanlanır.
+        Durum değiştiyse True döner.
+        """
+        if participant.remote or participant._columns is not self.columns:
+            return False
+        slot = participant._slot
+        if bool(self.columns.local[slot]) != away:
+            return False
+        if away:
+            participant.current_session_start = None
+        self.columns.set_local(slot, not away)
+        return True
+
+    def set_session_start(self, ts: Optional[float], only_missing: bool = False):
+        """Bu worker'a bağlı herkesin (only_missing ise yalnızca oturumu olmayanların) başlangıcını ayarlar"""
+        if self.columns is not None:
+            self.columns.set_session_starts(ts, only_missing)
+
+    def finish_sessions(self, now: float, max_duration: int) -> List[Tuple[Participant, int, float]]:
+        """Tüm oturumları kapatıp puanları ekler; bkz. ParticipantColumns.finish"""
+        if self.columns is None:
+            return []
+        return self.columns.finish(now, max_duration)
+
+    def timer_snapshot(self) -> dict:
+        """Sayaç ve ayarların worker'lar arası aktarılan kopyası"""
+        timer = self.timer
+        return {
+            "mode": timer.mode,
+            "remaining_seconds": timer.remaining_seconds,
+            "is_running": timer.is_running,
+            "target_timestamp": timer.target_timestamp,
+            "settings": self.settings.to_dict()
+        }
+
+    def apply_timer_snapshot(self, snapshot: dict):
+        timer = self.timer
+        timer.mode = snapshot["mode"]
+        timer.remaining_seconds = snapshot["remaining_seconds"]
+        timer.is_running = snapshot["is_running"]
+        timer.target_timestamp = snapshot["target_timestamp"]
+        settings = snapshot["settings"]
+        self.settings.work_duration = settings["work_duration"]
+        self.settings.short_break = settings["short_break"]
+        self.settings.long_break = settings["long_break"]
+
+
+def stats_bucket(period: str, timestamp: float) -> str:
+    """Zamanın düştüğü UTC özet dilimi: gün "2026-10-17", ISO hafta "2026-W42", tüm zamanlar için all"""
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    if period == "day":
+        return moment.strftime("%Y-%m-%d")
+    if period == "week":
+        year, week, _ = moment.isocalendar()
+        return f"{year}-W{week:02d}"
+    return "all"
+
+
+class RoomStore:
+    """
+    Oda durumu ve puanlar için kalıcılık arayüzü.
+    Varsayılan uygulama hiçbir şey saklamaz (yalnızca bellek).
+    """
+
+    async def load_room(self, room: Room) -> bool:
+        """Kayıtlı durumu `room` içine yükler; kayıt varsa True döner"""
+        return False
+
+    def mark_dirty(self, room: Room):
+        """Odanın sayaç/ayar durumu değişti; bir sonraki yazımda kaydedilecek"""
+
+    def record_score(self, room_id: str, user_name: str, total_seconds: int):
+        """Kullanıcının güncel toplam puanı; bir sonraki yazımda kaydedilecek"""
+
+    def record_session(self, room_id: str, user_name: str, mode: str,
+                       started_at: float, ended_at: float, seconds: int):
+        """Tamamlanan bir seans; bir sonraki yazımda oturum günlüğüne ve özetlere eklenecek"""
+
+    async def leaderboard(self, period: str, bucket: str, room_id: str, limit: int,
+                          after: Optional[Tuple[int, str]] = None) -> List[tuple]:
+        """
+        Özetten sıralı bir sayfa: [(user_name, seconds, sessions), ...].
+        room_id "" tüm odalardır; `after` önceki sayfanın son (seconds, user_name) değeridir.
+        """
+        return []
+
+    async def user_history(self, user_name: str, period: str, room_id: str, limit: int) -> List[tuple]:
+        """Kullanıcının en yeni dilimden geriye özetleri: [(bucket, seconds, sessions), ...]"""
+        return []
+
+    async def load_totals(self) -> List[tuple]:
+        """Tüm odalardaki puanların kullanıcı başına toplamı: [(user_name, total_seconds), ...]"""
+        return []
+
+    async def flush(self):
+        """Bekleyen değişiklikleri hemen yazar"""
+
+    async def close(self):
+        """Bekleyen değişiklikleri yazar ve kaynakları bırakır"""
+
+
+class SQLiteRoomStore(RoomStore):
+    """
+    SQLite (WAL modu) üzerinde write-behind kalıcılık.
+    Değişiklikler bellekte biriktirilir ve `flush_interval` saniyede bir toplu yazılır.
+    Tüm disk işlemleri tek iş parçacıklı bir executor'da çalışır; event loop beklemez.
+
+    Seanslar `sessions` tablosuna yalnızca eklenir; `session_rollups` (dönem, dilim, oda, kullanıcı) başına
+    toplamları aynı işlemde artırır. Oda "" tüm odaların toplamıdır.
+    """
+
+    def __init__(self, path: str, flush_interval: float = PERSIST_FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._dirty_rooms: Dict[str, Room] = {}
+        self._dirty_scores: Dict[tuple, int] = {}
+        self._pending_sessions: List[tuple] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def _run_in_executor(self, fn, *args):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sqlite-store")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _connection(self) -> sqlite3.Connection:
+        # Yalnızca executor iş parçacığında çağrılır
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS rooms (
+                    room_id TEXT PRIMARY KEY,
+                    mode TEXT NOT NULL,
+                    remaining_seconds INTEGER NOT NULL,
+                    is_running INTEGER NOT NULL,
+                    target_timestamp REAL,
+                    work_duration INTEGER NOT NULL,
+                    short_break INTEGER NOT NULL,
+                    long_break INTEGER NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS scores (
+                    room_id TEXT NOT NULL,
+                    user_name TEXT NOT NULL,
+                    total_seconds INTEGER NOT NULL,
+                    PRIMARY KEY (room_id, user_name)
+                );
+                CREATE TABLE IF NOT EXISTS sessions (
+                    id INTEGER PRIMARY KEY,
+                    room_id TEXT NOT NULL,
+                    user_name TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    ended_at REAL NOT NULL,
+                    seconds INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_room_time ON sessions (room_id, ended_at);
+                CREATE INDEX IF NOT EXISTS sessions_user_time ON sessions (user_name, ended_at);
+                CREATE TABLE IF NOT EXISTS session_rollups (
+                    period TEXT NOT NULL,
+                    bucket TEXT NOT NULL,
+                    room_id TEXT NOT NULL,
+                    user_name TEXT NOT NULL,
+                    seconds INTEGER NOT NULL,
+                    sessions INTEGER NOT NULL,
+                    PRIMARY KEY (period, bucket, room_id, user_name)
+                );
+                CREATE INDEX IF NOT EXISTS session_rollups_rank
+                    ON session_rollups (period, bucket, room_id, seconds DESC, user_name);
+                CREATE INDEX IF NOT EXISTS session_rollups_user
+                    ON session_rollups (user_name, room_id, period, bucket);
+            """)
+            self._conn = conn
+        return self._conn
+
+    def _read(self, room_id: str):
+        conn = self._connection()
+        room_row = conn.execute(
+            "SELECT mode, remaining_seconds, is_running, target_timestamp, "
+            "work_duration, short_break, long_break FROM rooms WHERE room_id = ?",
+            (room_id,)
+        ).fetchone()
+        score_rows = conn.execute(
+            "SELECT user_name, total_seconds FROM scores WHERE room_id = ?",
+            (room_id,)
+        ).fetchall()
+        return room_row, score_rows
+
+    def _write(self, room_rows: list, score_rows: list, session_rows: list):
+        conn = self._connection()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO rooms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                room_rows
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO scores VALUES (?, ?, ?)",
+                score_rows
+            )
+            if session_rows:
+                conn.executemany(
+                    "INSERT INTO sessions (room_id, user_name, mode, started_at, ended_at, seconds) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    session_rows
+                )
+                conn.executemany(
+                    "INSERT INTO session_rollups VALUES (?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (period, bucket, room_id, user_name) DO UPDATE SET "
+                    "seconds = seconds + excluded.seconds, sessions = sessions + excluded.sessions",
+                    self._rollup_rows(session_rows)
+                )
+
+    @staticmethod
+    def _rollup_rows(session_rows: list) -> list:
+        # Yığın önce bellekte toplanır; her (dönem, dilim, oda, kullanıcı) için tek upsert yapılır
+        totals: Dict[tuple, List[int]] = {}
+        for room_id, user_name, _mode, _started_at, ended_at, seconds in session_rows:
+            for period in STATS_PERIODS:
+                bucket = stats_bucket(period, ended_at)
+                for scope in (room_id, ""):
+                    total = totals.setdefault((period, bucket, scope, user_name), [0, 0])
+                    total[0] += seconds
+                    total[1] += 1
+        return [key + (seconds, count) for key, (seconds, count) in totals.items()]
+
+    def _read_leaderboard(self, period: str, bucket: str, room_id: str, limit: int,
+                          after: Optional[Tuple[int, str]]):
+        conn = self._connection()
+        if after is None:
+            return conn.execute(
+                "SELECT user_name, seconds, sessions FROM session_rollups "
+                "WHERE period = ? AND bucket = ? AND room_id = ? "
+                "ORDER BY seconds DESC, user_name LIMIT ?",
+                (period, bucket, room_id, limit)
+            ).fetchall()
+        # Keyset sayfalama: OFFSET'in aksine derin sayfalar da indeksten doğrudan okunur
+        seconds, user_name = after
+        return conn.execute(
+            "SELECT user_name, seconds, sessions FROM session_rollups "
+            "WHERE period = ? AND bucket = ? AND room_id = ? "
+            "AND (seconds < ? OR (seconds = ? AND user_name > ?)) "
+            "ORDER BY seconds DESC, user_name LIMIT ?",
+            (period, bucket, room_id, seconds, seconds, user_name, limit)
+        ).fetchall()
+
+    def _read_user_history(self, user_name: str, period: str, room_id: str, limit: int):
+        return self._connection().execute(
+            "SELECT bucket, seconds, sessions FROM session_rollups "
+            "WHERE user_name = ? AND room_id = ? AND period = ? "
+            "ORDER BY bucket DESC LIMIT ?",
+            (user_name, room_id, period, limit)
+        ).fetchall()
+
+    async def leaderboard(self, period: str, bucket: str, room_id: str, limit: int,
+                          after: Optional[Tuple[int, str]] = None) -> List[tuple]:
+        return await self._run_in_executor(self._read_leaderboard, period, bucket, room_id, limit, after)
+
+    async def user_history(self, user_name: str, period: str, room_id: str, limit: int) -> List[tuple]:
+        return await self._run_in_executor(self._read_user_history, user_name, period, room_id, limit)
+
+    def _read_totals(self):
+        return self._connection().execute(
+            "SELECT user_name, SUM(total_seconds) FROM scores GROUP BY user_name"
+        ).fetchall()
+
+    async def load_totals(self) -> List[tuple]:
+        return await self._run_in_executor(self._read_totals)
+
+    async def load_room(self, room: Room) -> bool:
+        room_row, score_rows = await self._run_in_executor(self._read, room.room_id)
+        # Bu arada bellekte daha yeni puanlar oluştuysa onlar geçerlidir
+        for user_name, total_seconds in score_rows:
+            room.set_score(user_name, total_seconds, keep_existing=True)
+        if room_row is None:
+            return bool(score_rows)
+
+        mode, remaining, is_running, target_timestamp, work, short, long_ = room_row
+        # Bu düzeltmeden önce yazılmış geçersiz (NULL) süreler varsayılana döner
+        room.settings.work_duration = valid_duration(work, DEFAULT_WORK_DURATION)
+        room.settings.short_break = valid_duration(short, DEFAULT_SHORT_BREAK)
+        room.settings.long_break = valid_duration(long_, DEFAULT_LONG_BREAK)
+        room.timer.mode = mode
+        room.timer.remaining_seconds = remaining
+        room.timer.is_running = bool(is_running)
+        room.timer.target_timestamp = target_timestamp
+        return True
+
+    def _ensure_running(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._flush_loop())
+
+    def mark_dirty(self, room: Room):
+        self._dirty_rooms[room.room_id] = room
+        self._ensure_running()
+
+    def record_score(self, room_id: str, user_name: str, total_seconds: int):
+        self._dirty_scores[(room_id, user_name)] = total_seconds
+        self._ensure_running()
+
+    def record_session(self, room_id: str, user_name: str, mode: str,
+                       started_at: float, ended_at: float, seconds: int):
+        self._pending_sessions.append((room_id, user_name, mode, started_at, ended_at, seconds))
+        self._ensure_running()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Kalıcılık yazma hatası: {e}")
+
+    async def flush(self):
+        if not self._dirty_rooms and not self._dirty_scores and not self._pending_sessions:
+            return
+
+        # Anlık görüntü event loop'ta alınır, yazım executor'da yapılır
+        now = time.time()
+        room_rows = [
+            (room.room_id, room.timer.mode, room.timer.remaining_seconds,
+             int(room.timer.is_running), room.timer.target_timestamp,
+             room.settings.work_duration, room.settings.short_break,
+             room.settings.long_break, now)
+            for room in self._dirty_rooms.values()
+        ]
+        score_rows = [
+            (room_id, user_name, total_seconds)
+            for (room_id, user_name), total_seconds in self._dirty_scores.items()
+        ]
+        session_rows = self._pending_sessions
+        self._dirty_rooms = {}
+        self._dirty_scores = {}
+        self._pending_sessions = []
+        await self._run_in_executor(self._write, room_rows, score_rows, session_rows)
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+        if self._conn is not None:
+            await self._run_in_executor(self._conn.close)
+            self._conn = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def create_store_from_env() -> RoomStore:
+    """PERSISTENCE ortam değişkenine göre kalıcılık katmanını seçer ("sqlite" veya "none")"""
+    if PERSISTENCE_BACKEND == "none":
+        return RoomStore()
+    if PERSISTENCE_BACKEND == "sqlite":
+        return SQLiteRoomStore(DATABASE_PATH)
+    raise ValueError(f"Bilinmeyen kalıcılık katmanı: {PERSISTENCE_BACKEND}")
+
+
+class Backplane:
+    """
+    Worker'lar (süreçler/sunucular) arasında oda olaylarını aktaran arayüz.
+    Her olay bir dict'tir: {"origin": worker_id, "kind": ..., "room": room_id, ...}.
+    `publish` beklemeden döner; alınan olaylar sırayla `handler`a verilir.
+    Yayıncı kendi olayını geri alabilir; filtreleme ConnectionManager'da yapılır.
+    """
+
+    async def start(self, handler: Callable[[dict], "asyncio.Future"]):
+        self._handler = handler
+
+    def publish(self, event: dict):
+        """Olayı diğer worker'lara gönderir"""
+
+    async def stop(self):
+        pass
+
+    async def _dispatch(self, event: dict):
+        try:
+            await self._handler(event)
+        except Exception as e:
+            logger.error(f"Backplane olay hatası: {e}")
+
+
+class InProcessBackplane(Backplane):
+    """
+    Aynı süreçteki yöneticiler arasında olay aktarır.
+    Tek worker'da (varsayılan) eşi olmadığından `publish` hiçbir şey yapmaz;
+    aynı `hub` listesini paylaşan birden çok yönetici birbirini görür (testler/benchmark'lar).
+    """
+
+    def __init__(self, hub: Optional[list] = None):
+        self._hub = hub if hub is not None else []
+        self._inbox: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler):
+        await super().start(handler)
+        self._inbox = asyncio.Queue()
+        self._task = asyncio.create_task(self._drain())
+        self._hub.append(self)
+
+    def publish(self, event: dict):
+        for peer in self._hub:
+            if peer is not self:
+                peer._inbox.put_nowait(event)
+
+    async def _drain(self):
+        while True:
+            event = await self._inbox.get()
+            await self._dispatch(event)
+
+    async def stop(self):
+        if self in self._hub:
+            self._hub.remove(self)
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+class UnixSocketBackplane(Backplane):
+    """
+    Aynı makinedeki worker'lar için Unix soketi üzerinden olay aktarımı (Redis gerektirmez).
+    `<path>.lock` dosyasını kilitleyebilen worker aracı (broker) olur ve soketi dinler;
+    diğerleri ona bağlanır. Aracı düşerse kilit serbest kalır ve kalanlardan biri yeni aracı olur.
+    Olaylar satır sonu ile ayrılmış JSON olarak taşınır.
+    """
+
+    RETRY_DELAY = 0.2
+    MAX_PENDING = 1024                # bağlantı yokken bekletilecek en fazla olay
+    MAX_CLIENT_BUFFER = 4 * 1024 * 1024  # aracının yavaş bir worker için tutacağı en fazla bayt
+    # Tek olay satırının en fazla boyutu; "scores" olayı puan alan herkesi taşır (kullanıcı başına ~110 B),
+    # varsayılan 64 KiB StreamReader sınırı birkaç yüz kişilik odalarda aşılır
+    MAX_LINE = 64 * 1024 * 1024
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock_file = None
+        self._server = None
+        self._clients: set = set()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._pending: Deque[bytes] = deque(maxlen=self.MAX_PENDING)
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, handler):
+        await super().start(handler)
+        self._task = asyncio.create_task(self._run())
+
+    def _try_become_broker(self) -> bool:
+        import fcntl
+
+        lock_file = open(self.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self._lock_file = lock_file
+        return True
+
+    async def _run(self):
+        # Beklenmeyen bir hata görevi bitirmesin; aksi halde worker sessizce olay almayı bırakır
+        while True:
+            try:
+                await self._connect()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Backplane hatası, yeniden başlatılıyor: {e}")
+                self._close()
+                await asyncio.sleep(self.RETRY_DELAY)
+
+    async def _connect(self):
+        while True:
+            if self._try_become_broker():
+                # Önceki aracıdan kalan soket dosyası varsa temizle
+                if os.path.exists(self.path):
+                    os.unlink(self.path)
+                self._server = await asyncio.start_unix_server(self._serve_client, path=self.path,
+                                                               limit=self.MAX_LINE)
+                logger.info(f"Backplane aracısı olarak dinleniyor: {self.path}")
+                while self._pending:
+                    self._relay(self._pending.popleft())
+                await asyncio.Future()  # durdurulana kadar
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=self.MAX_LINE)
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(self.RETRY_DELAY)
+                continue
+            self._writer = writer
+            while self._pending:
+                writer.write(self._pending.popleft())
+            try:
+                async for line in self._read_lines(reader):
+                    event = self._decode(line)
+                    if event is not None:
+                        await self._dispatch(event)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                self._writer = None
+                writer.close()
+            logger.warning("Backplane aracısı bağlantısı koptu, yeniden bağlanılıyor")
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._clients.add(writer)
+        try:
+            async for line in self._read_lines(reader):
+                event = self._decode(line)
+                if event is None:
+                    continue
+                self._relay(line, exclude=writer)
+                await self._dispatch(event)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._clients.discard(writer)
+            writer.close()
+
+    @staticmethod
+    async def _read_lines(reader: asyncio.StreamReader):
+        """Satırları okur; MAX_LINE'ı aşan satır atlanır, bağlantı ve okuma döngüsü sürer"""
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError as e:
+                logger.error(f"Backplane satırı sınırı aştı, atlandı: {e}")
+                continue
+            if not line:
+                return
+            yield line
+
+    @staticmethod
+    def _decode(line: bytes) -> Optional[dict]:
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            logger.error(f"Bozuk backplane olayı atlandı: {e}")
+            return None
+
+    def _relay(self, line: bytes, exclude: Optional[asyncio.StreamWriter] = None):
+        for client in list(self._clients):
+            if client is exclude:
+                continue
+            if client.transport.get_write_buffer_size() > self.MAX_CLIENT_BUFFER:
+                logger.warning("Yavaş backplane istemcisi ayrılıyor")
+                self._clients.discard(client)
+                client.close()
+                continue
+            client.write(line)
+
+    def publish(self, event: dict):
+        line = (json_encoder(event) + "\n").encode("utf-8")
+        if self._server is not None:
+            self._relay(line)
+        elif self._writer is not None:
+            self._writer.write(line)
+        else:
+            self._pending.append(line)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._close()
+
+    def _close(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for client in list(self._clients):
+            client.close()
+        self._clients.clear()
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+
+class RedisBackplane(Backplane):
+    """
+    Redis (veya uyumlu bir sunucu) pub/sub kanalı üzerinden olay aktarımı; birden çok makinede çalışır.
+    `redis` paketi opsiyoneldir ve yalnızca bu sınıf kullanılırken gerekir.
+    """
+
+    def __init__(self, url: str, channel: str = "pomodoro:events"):
+        if aioredis is None:
+            raise RuntimeError("RedisBackplane için 'redis' paketi kurulu olmalı")
+        self.url = url
+        self.channel = channel
+        self._redis = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._tasks: list = []
+
+    async def start(self, handler):
+        await super().start(handler)
+        self._redis = aioredis.from_url(self.url)
+        pubsub = self._redis.pubsub()
+        await pubsub.subscribe(self.channel)
+        self._outbox = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._listen(pubsub)),
+            asyncio.create_task(self._send_loop()),
+        ]
+
+    async def _listen(self, pubsub):
+        async for message in pubsub.listen():
+            if message.get("type") == "message":
+                await self._dispatch(json.loads(message["data"]))
+
+    async def _send_loop(self):
+        while True:
+            data = await self._outbox.get()
+            try:
+                await self._redis.publish(self.channel, data)
+            except Exception as e:
+                logger.error(f"Redis yayın hatası: {e}")
+
+    def publish(self, event: dict):
+        if self._outbox is not None:
+            self._outbox.put_nowait(json_encoder(event))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+
+def create_backplane_from_env() -> Backplane:
+    """BACKPLANE ortam değişkenine göre worker'lar arası aktarımı seçer ("local", "unix" veya "redis")"""
+    if BACKPLANE_BACKEND == "local":
+        return InProcessBackplane()
+    if BACKPLANE_BACKEND == "unix":
+        return UnixSocketBackplane(BACKPLANE_SOCKET)
+    if BACKPLANE_BACKEND == "redis":
+        return RedisBackplane(BACKPLANE_URL)
+    raise ValueError(f"Bilinmeyen backplane: {BACKPLANE_BACKEND}")
+
+
+class PresenceBatch:
+    """
+    Bir odada kısa bir pencere içinde biriken katılma/ayrılma olayları.
+    Pencere sonunda odaya tek bir "presence" mesajı olarak gönderilir; böylece aynı anda
+    katılan N kişi için N² yerine N mesaj gider.
+    """
+
+    __slots__ = ("added", "silent", "removed", "left_names", "handle")
+
+    def __init__(self):
+        self.added: Dict[str, Participant] = {}
+        self.silent: set = set()
+        self.removed: List[str] = []
+        self.left_names: List[str] = []
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+    def add(self, participant: Participant, announce: bool = True):
+        self.added[participant.id] = participant
+        if not announce:
+            self.silent.add(participant.id)
+
+    def remove(self, participant: Participant):
+        # Pencere içinde gelip giden kullanıcı duyurulmaz; ama bu arada tam listeyi
+        # almış istemciler için kimliği yine de "removed" içinde gider
+        if self.added.pop(participant.id, None) is None:
+            self.left_names.append(participant.name)
+        self.removed.append(participant.id)
+
+    def to_message(self, room: Room) -> dict:
+        """Sıraları gönderim anındaki liderlik tablosuna göre hesaplar (küçükten büyüğe)"""
+        added = sorted(((room.rank_of(user_id), participant)
+                        for user_id, participant in self.added.items() if user_id in room.users),
+                       key=lambda item: item[0])
+        return {
+            "type": "presence",
+            "added": [{"user": participant.to_public(), "rank": rank} for rank, participant in added],
+            "removed": self.removed,
+            "joined": [participant.name for _, participant in added
+                       if participant.id not in self.silent],
+            "left": self.left_names
+        }
+
+
+class SpectatorGroup:
+    """
+    Bir odanın izleyici bağlantıları. Sayaç olayları `handle` ile bekletilir ve pencere sonunda
+    tek çerçeve olarak herkese gider; sessiz bir dönemden sonraki ilk olay hemen gönderilir.
+    """
+
+    __slots__ = ("connections", "handle", "sent_at")
+
+    def __init__(self):
+        self.connections: Dict[WebSocket, ClientConnection] = {}
+        self.handle: Optional[asyncio.TimerHandle] = None
+        self.sent_at = float("-inf")
+
+
+class ResumeSession:
+    """
+    Katılımda verilen resume_token'ın kaydı. Bağlantı koptuğunda katılımcı hemen silinmez;
+    RESUME_GRACE süresi içinde aynı token ile dönen istemci kaydını ve puanını geri alır.
+    """
+
+    __slots__ = ("token", "room_id", "participant", "websocket", "handle")
+
+    def __init__(self, token: str, room_id: str, participant: Participant, websocket: WebSocket):
+        self.token = token
+        self.room_id = room_id
+        self.participant = participant
+        self.websocket: Optional[WebSocket] = websocket
+        self.handle: Optional[asyncio.TimerHandle] = None
+
+
+class RoomActor:
+    """
+    Bir odanın tüm durum değişikliklerini sırayla işleyen tek tüketicili komut kuyruğu.
+    Aynı tur içinde gelen komutlar tek seferde alınıp art arda işlenir; böylece bir odanın
+    komutları `await` noktalarında birbirine karışmaz ve global kilit gerekmez.
+    Kuyruk boşalınca görev sonlanır; boştaki odalar için görev tutulmaz.
+    """
+
+    __slots__ = ("room_id", "queue", "task", "on_idle")
+
+    def __init__(self, room_id: str, on_idle: Callable[["RoomActor"], None]):
+        self.room_id = room_id
+        self.queue: Deque[tuple] = deque()
+        self.task: Optional[asyncio.Task] = None
+        self.on_idle = on_idle
+
+    def submit(self, fn: Callable, args: tuple, future: Optional[asyncio.Future] = None):
+        self.queue.append((fn, args, future))
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        try:
+            while self.queue:
+                batch, self.queue = self.queue, deque()
+                ROOM_COMMAND_BATCH.observe(len(batch))
+                for fn, args, future in batch:
+                    try:
+                        result = await fn(*args)
+                    except Exception as e:
+                        if future is None:
+                            logger.error(f"Oda komutu hatası ({self.room_id}): {e}")
+                        elif not future.done():
+                            future.set_exception(e)
+                    else:
+                        if future is not None and not future.done():
+                            future.set_result(result)
+        finally:
+            self.task = None
+            self.on_idle(self)
+
+
+class RoomEvictor:
+    """
+    Boştaki (bağlantısı kalmamış) odaları boşalma sırasına göre tutar.
+    Sıra bir OrderedDict'tir; en eski boş oda başta olduğundan tarama yalnızca
+    süresi dolanlara bakar, tüm odaları gezmez.
+    """
+
+    def __init__(self, ttl: float = ROOM_IDLE_TTL, max_rooms: int = MAX_ROOMS):
+        self.ttl = ttl
+        self.max_rooms = max_rooms
+        self._idle: "OrderedDict[str, float]" = OrderedDict()
+        self.evicted_ttl = 0
+        self.evicted_lru = 0
+
+    def __len__(self):
+        return len(self._idle)
 
-templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+    def mark_idle(self, room_id: str, now: float):
+        self._idle[room_id] = now
+        self._idle.move_to_end(room_id)
 
-# Static dosyalar için
-if STATIC_DIR.exists():
-    app.mount("/static", StaticFiles(directory=str(STATIC_DIR)), name="static")
+    def mark_active(self, room_id: str):
+        self._idle.pop(room_id, None)
 
-# Varsayılan Pomodoro ayarları (saniye cinsinden)
-DEFAULT_WORK_DURATION = 25 * 60      # 25 dakika
-DEFAULT_SHORT_BREAK = 5 * 60         # 5 dakika
-DEFAULT_LONG_BREAK = 15 * 60         # 15 dakika
+    def expired(self, now: float, live_rooms: int, room_limit: Optional[int] = None) -> List[Tuple[str, str]]:
+        """Atılacak odaları (room_id, sebep) olarak döner ve sıradan çıkarır"""
+        if room_limit is None:
+            room_limit = self.max_rooms
+        evicted = []
+        while self._idle:
+            room_id, idle_since = next(iter(self._idle.items()))
+            if now - idle_since >= self.ttl:
+                reason = "ttl"
+            elif room_limit and live_rooms - len(evicted) > room_limit:
+                reason = "lru"
+            else:
+                break
+            self._idle.popitem(last=False)
+            evicted.append((room_id, reason))
+        self.evicted_ttl += sum(1 for _, reason in evicted if reason == "ttl")
+        self.evicted_lru += sum(1 for _, reason in evicted if reason == "lru")
+        return evicted
 
 
 class ConnectionManager:
     """
     WebSocket bağlantılarını ve oda durumlarını yöneten sınıf.
+    
+    Odanın durumunu değiştiren her şey (istemci komutları, zamanlayıcı, ayrılmalar, backplane
+    olayları) `submit`/`call` ile odanın aktörüne verilir ve sırayla işlenir. Aktör içinde
+    çalışan metotlar birbirini doğrudan çağırır; tekrar `call` etmez.
+    
+    Birden çok worker çalışırken her worker kendi soketlerini tutar ve odanın bir kopyasını
+    saklar; sayaç değişiklikleri, katılım/ayrılmalar ve puanlar backplane üzerinden
+    diğer worker'lara olay olarak aktarılır. Her worker yalnızca kendi kullanıcılarını puanlar.
     """
     
-    def __init__(self):
-        self.active_connections: Dict[str, Dict[WebSocket, dict]] = {}
-        self.room_states: Dict[str, dict] = {}
-    
-    async def connect(self, websocket: WebSocket, room_id: str, user_name: str):
-        """Kullanıcıyı bir odaya bağlar"""
-        # Oda yoksa oluştur
-        if room_id not in self.active_connections:
-            self.active_connections[room_id] = {}
-            self.room_states[room_id] = {
-                "timer": {
-                    "remaining_seconds": DEFAULT_WORK_DURATION,
-                    "is_running": False,
-                    "target_timestamp": None,
-                    "mode": "work"
-                },
-                "settings": {
-                    "work_duration": DEFAULT_WORK_DURATION,
-                    "short_break": DEFAULT_SHORT_BREAK,
-                    "long_break": DEFAULT_LONG_BREAK
-                },
-                "users": []
-            }
+    def __init__(self, store: Optional[RoomStore] = None, backplane: Optional[Backplane] = None,
+                 evictor: Optional[RoomEvictor] = None, presence_window: float = PRESENCE_WINDOW,
+                 resume_grace: float = RESUME_GRACE, spectator_interval: float = SPECTATOR_INTERVAL):
+        self.active_connections: Dict[str, Dict[WebSocket, ClientConnection]] = {}
+        self.room_states: Dict[str, Room] = {}
+        # Oda bitişlerini sunucu belirler; istemcinin "timer_completed" sinyali yalnızca yardımcıdır
+        self.scheduler = TimerScheduler(self._on_deadline)
+        self._actors: Dict[str, RoomActor] = {}
+        self.store = store or RoomStore()
+        self.backplane = backplane or InProcessBackplane()
+        self.worker_id = uuid.uuid4().hex
+        self.evictor = evictor if evictor is not None else RoomEvictor()
+        self._sweep_task: Optional[asyncio.Task] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        # Aynı oda için eşzamanlı ilk erişimler tek bir yüklemeyi bekler
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Oda başına biriken katılma/ayrılma bildirimleri
+        self.presence_window = presence_window
+        self._presence: Dict[str, PresenceBatch] = {}
+        # resume_token -> yeniden bağlanma kaydı
+        self.resume_grace = resume_grace
+        self._sessions: Dict[str, ResumeSession] = {}
+        # Oda başına izleyici (salt okunur) bağlantılar; katılımcılardan ayrı tutulur
+        self.spectator_interval = spectator_interval
+        self.spectators: Dict[str, SpectatorGroup] = {}
+        # Genel liderlik tablosu ve sıra değişikliklerine abone bağlantılar
+        self.leaderboard = GlobalLeaderboard()
+        self._leaderboard_subscribers: Dict[ClientConnection, int] = {}  # bağlantı -> limit
+        # Limit başına abonelere en son bildirilen ilk `limit` isim; pencereden çıkanlar buna göre bulunur
+        self._leaderboard_windows: Dict[int, set] = {}
+        self._leaderboard_pending: set = set()
+        self._leaderboard_task: Optional[asyncio.Task] = None
+    
+    async def start(self):
+        """Arka plan bileşenlerini başlatır (uygulama açılışında)"""
+        try:
+            self.leaderboard.load(await self.store.load_totals())
+        except Exception as e:
+            logger.error(f"Genel liderlik tablosu yüklenemedi: {e}")
+        await self.backplane.start(self.handle_backplane_event)
+        self._sweep_task = asyncio.create_task(self._sweep_loop())
+        self._heartbeat_task = asyncio.create_task(self._heartbeat_loop())
+    
+    async def stop(self):
+        """Arka plan görevlerini durdurur ve bekleyen kayıtları yazar"""
+        if self._sweep_task is not None:
+            self._sweep_task.cancel()
+            self._sweep_task = None
+        if self._heartbeat_task is not None:
+            self._heartbeat_task.cancel()
+            self._heartbeat_task = None
+        if self._leaderboard_task is not None:
+            self._leaderboard_task.cancel()
+            self._leaderboard_task = None
+        await self.scheduler.stop()
+        await self.backplane.stop()
+        await self.store.close()
+    
+    def submit(self, room_id: str, fn: Callable, *args):
+        """Komutu odanın aktörüne verir ve beklemeden döner"""
+        self._actor(room_id).submit(fn, args)
+    
+    async def call(self, room_id: str, fn: Callable, *args):
+        """Komutu odanın aktörüne verir ve sonucunu bekler"""
+        future = asyncio.get_running_loop().create_future()
+        self._actor(room_id).submit(fn, args, future)
+        return await future
+    
+    def _actor(self, room_id: str) -> RoomActor:
+        actor = self._actors.get(room_id)
+        if actor is None:
+            actor = self._actors[room_id] = RoomActor(room_id, self._actor_idle)
+        return actor
+    
+    def _actor_idle(self, actor: RoomActor):
+        if not actor.queue and self._actors.get(actor.room_id) is actor:
+            del self._actors[actor.room_id]
+    
+    async def _on_deadline(self, room_id: str):
+        # Zamanlayıcı görevi tek bir odayı beklememeli
+        self.submit(room_id, self.finish_timer_and_reward, room_id)
+    
+    async def _sweep_loop(self):
+        while True:
+            await asyncio.sleep(EVICTION_SWEEP_INTERVAL)
+            self.evict_idle_rooms()
+    
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            self.heartbeat(time.monotonic())
+    
+    def heartbeat(self, now: float) -> int:
+        """
+        Tüm bağlantıları tek geçişte dolaşır: sessiz olanlara ortak bir "ping" çerçevesi koyar,
+        yanıt vermeyen ya da gönderimi takılanları toplu kapatır. Kapatılan bağlantı sayısını döner.
+        """
+        ping = encode_frame({"type": "ping"})
+        dead = []
+        groups = [(room_id, connections, False) for room_id, connections in self.active_connections.items()]
+        groups.extend((room_id, group.connections, True) for room_id, group in self.spectators.items())
+        for room_id, connections, spectator in groups:
+            for websocket, connection in list(connections.items()):
+                stalled = connection.send_started is not None and now - connection.send_started > SEND_STALL_TIMEOUT
+                if stalled or now - connection.last_seen > HEARTBEAT_TIMEOUT:
+                    dead.append((room_id, websocket, spectator))
+                elif now - connection.last_seen >= HEARTBEAT_INTERVAL:
+                    connection.enqueue(ping)
         
-        # Şimdiki zamanı al (UTC)
-        now = datetime.now(timezone.utc)
-        
-        # Kullanıcı bilgisini oluştur (RANK SİSTEMİ İÇİN GÜNCELLENDİ)
-        user_info = {
-            "name": user_name,
-            "id": str(uuid.uuid4()),
-            "joined_at": now.isoformat(),
-            "total_seconds": 0,  # <--- Toplam puan (saniye cinsinden)
-            # Eğer o sırada timer çalışıyorsa, başlangıç zamanını "şimdi" yap (Geç gelen için)
-            # Çalışmıyorsa None yap
-            "current_session_start": now.isoformat() if self.room_states[room_id]["timer"]["is_running"] else None
+        for room_id, websocket, spectator in dead:
+            # Yarı açık bağlantılar yeniden bağlanabilir; kayıt RESUME_GRACE boyunca tutulur
+            if spectator:
+                self.disconnect_spectator(websocket, room_id)
+            else:
+                self.disconnect(websocket, room_id)
+            asyncio.create_task(self.close_socket(websocket))
+        if dead:
+            HEARTBEAT_REAPED.inc(len(dead))
+            logger.info(f"Heartbeat: yanıt vermeyen {len(dead)} bağlantı kapatıldı")
+        return len(dead)
+    
+    async def close_socket(self, websocket: WebSocket, code: int = 1001):
+        """Soketi kapatır; zaten kapanmış ya da kopmuş soketlerin hatası yok sayılır"""
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+    
+    def evict_idle_rooms(self, room_limit: Optional[int] = None) -> int:
+        """Süresi dolan ya da sınırı aşan boş odaları bellekten atar; atılan oda sayısını döner"""
+        expired = self.evictor.expired(time.time(), len(self.room_states), room_limit)
+        for room_id, reason in expired:
+            self._evict_room(room_id, reason)
+        return len(expired)
+    
+    def _evict_room(self, room_id: str, reason: str):
+        if self.active_connections.get(room_id) or room_id in self.spectators:
+            return
+        room = self.room_states.pop(room_id, None)
+        self.active_connections.pop(room_id, None)
+        if room is None:
+            return
+        self.scheduler.cancel(room_id)
+        batch = self._presence.pop(room_id, None)
+        if batch is not None and batch.handle is not None:
+            batch.handle.cancel()
+        # Son durum kalıcılık katmanına yazılır; oda tekrar açıldığında oradan yüklenir
+        self.store.mark_dirty(room)
+        logger.info(f"Boş oda bellekten atıldı ({reason}): '{room_id}'")
+    
+    def room_stats(self) -> dict:
+        return {
+            "live": len(self.room_states),
+            "idle": len(self.evictor),
+            "evicted_ttl": self.evictor.evicted_ttl,
+            "evicted_lru": self.evictor.evicted_lru
         }
+    
+    def publish(self, kind: str, room_id: str, **payload):
+        """Oda olayını diğer worker'lara gönderir"""
+        payload["origin"] = self.worker_id
+        payload["kind"] = kind
+        payload["room"] = room_id
+        self.backplane.publish(payload)
+    
+    async def get_room(self, room_id: str) -> Room:
+        """Odayı döner; bellekte yoksa kalıcılık katmanından (ilk erişimde) yükler ya da oluşturur"""
+        room = self.room_states.get(room_id)
+        if room is not None:
+            return room
         
-        self.active_connections[room_id][websocket] = user_info
+        pending = self._loading.get(room_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
         
-        # Kullanıcı listesine ekle (id kontrolü ile)
-        existing_user = next(
-            (u for u in self.room_states[room_id]["users"] if u["id"] == user_info["id"]),
-            None
-        )
-        if not existing_user:
-            self.room_states[room_id]["users"].append(user_info)
+        future = asyncio.get_running_loop().create_future()
+        self._loading[room_id] = future
+        try:
+            # Oda sınırına ulaşıldıysa yeni oda için en eski boş odaları hemen at
+            if self.evictor.max_rooms and len(self.room_states) >= self.evictor.max_rooms:
+                self.evict_idle_rooms(room_limit=self.evictor.max_rooms - 1)
+            room = Room(room_id)
+            try:
+                await self.store.load_room(room)
+            except Exception as e:
+                logger.error(f"Oda yükleme hatası ({room_id}): {e}")
+            if room.timer.is_running and room.timer.target_timestamp is not None:
+                self.scheduler.schedule(room_id, room.timer.target_timestamp)
+            self.room_states[room_id] = room
+            self.active_connections.setdefault(room_id, {})
+            # Yeni oda henüz boş; bağlantı gelmezse diğer boş odalar gibi tahliye edilir
+            self.evictor.mark_idle(room_id, time.time())
+            # Odayı zaten barındıran worker'lardan güncel durum ve kullanıcıları iste
+            self.publish("hello", room_id)
+            future.set_result(room)
+            return room
+        finally:
+            del self._loading[room_id]
+            if not future.done():
+                future.cancel()
+    
+    async def connect(self, websocket: WebSocket, room_id: str, user_name: str,
+                      resume_token: Optional[str] = None, last_seq: Optional[int] = None,
+                      codec: MessageCodec = JSON_CODEC) -> ClientConnection:
+        """
+        Kullanıcıyı bir odaya bağlar ve bağlantı kaydını döner. Geçerli bir `resume_token` ile gelen
+        istemci eski katılımcı kaydını geri alır ve `last_seq`'ten sonra kaçırdığı deltaları alır.
+        `codec` bağlantı açılırken anlaşılan mesaj kodlamasıdır.
+        """
+        # Oda yoksa yükle ya da oluştur
+        room = await self.get_room(room_id)
+        self.evictor.mark_active(room_id)
+        CONNECTS.inc()
+        
+        session = self._sessions.get(resume_token) if resume_token else None
+        if session is not None and session.room_id == room_id and session.participant.id in room.users:
+            return await self._resume(websocket, room, session, last_seq, codec)
+        
+        # Kullanıcı bilgisini oluştur (aynı isimle daha önce kazanılmış puan korunur)
+        participant = Participant(user_name, total_seconds=room.score_of(user_name))
+        # Eğer o sırada timer çalışıyorsa, başlangıç zamanını "şimdi" yap (Geç gelen için)
+        if room.timer.is_running:
+            participant.current_session_start = participant.joined_at
+        
+        connection = self._attach(websocket, room_id, participant, codec)
+        self._open_session(room_id, participant, websocket)
+        room.add_user(participant)
         
         logger.info(f"Kullanıcı '{user_name}' '{room_id}' odasına katıldı")
         
-        # Bildirimler
-        await self.broadcast_user_joined(room_id, user_name, websocket)
+        self.publish("user_added", room_id, user=participant.to_event())
+        
+        # Bildirimler: yeni gelene hemen tam liste, odaya ise biriktirilmiş tek "presence" mesajı
+        await self.send_session(websocket, room_id, participant, resumed=False)
+        await self.send_current_state(websocket, room_id)
+        await self.send_user_list(websocket, room_id)
+        await self.announce_joined(room_id, participant)
+        return connection
+    
+    async def _resume(self, websocket: WebSocket, room: Room, session: ResumeSession,
+                      last_seq: Optional[int], codec: MessageCodec = JSON_CODEC) -> ClientConnection:
+        """Yeniden bağlanan istemciye eski kaydını verir; odaya katılım duyurulmaz"""
+        room_id = room.room_id
+        participant = session.participant
+        if session.handle is not None:
+            session.handle.cancel()
+            session.handle = None
+        if session.websocket is not None:
+            # Eski soketin kapandığı henüz fark edilmediyse bağlantıyı yenisi devralır
+            old = self.active_connections[room_id].pop(session.websocket, None)
+            if old is not None:
+                old.close()
+            # Eski uç nokta komut göndermeye devam etmesin; soketi de kapatılır
+            asyncio.create_task(self.close_socket(session.websocket))
+        
+        # Token tek kullanımlıktır; her dönüşte yenisi verilir
+        del self._sessions[session.token]
+        if room.set_away(participant, False) and room.timer.is_running:
+            # Yokken geçen süre sayılmaz; oturum dönüş anından başlar
+            participant.current_session_start = time.time()
+        connection = self._attach(websocket, room_id, participant, codec)
+        self._open_session(room_id, participant, websocket)
+        RESUMES.inc()
+        
+        logger.info(f"Kullanıcı '{participant.name}' '{room_id}' odasına yeniden bağlandı")
+        
+        await self.send_session(websocket, room_id, participant, resumed=True)
         await self.send_current_state(websocket, room_id)
-        await self.broadcast_user_list(room_id)
+        missed = room.deltas_since(last_seq) if last_seq is not None else None
+        # Kaçırılanlar kuyruğa sığmıyorsa tek tek göndermek bağlantıyı düşürürdü; tam liste tek çerçevedir
+        if missed is None or not connection.has_room_for(missed):
+            await self.send_user_list(websocket, room_id)
+            return connection
+        for frame in missed:
+            connection.enqueue(frame)
+        return connection
+    
+    async def connect_spectator(self, websocket: WebSocket, room_id: str,
+                                codec: MessageCodec = JSON_CODEC) -> ClientConnection:
+        """
+        Bağlantıyı odanın izleyici grubuna ekler ve güncel sayaç durumunu gönderir.
+        İzleyici için katılımcı kaydı oluşturulmaz; presence, puanlama ve kullanıcı listesi onu görmez.
+        """
+        room = await self.get_room(room_id)
+        self.evictor.mark_active(room_id)
+        group = self.spectators.get(room_id)
+        if group is None:
+            group = self.spectators[room_id] = SpectatorGroup()
+        connection = group.connections[websocket] = ClientConnection(
+            websocket, None,
+            on_error=lambda conn: self.disconnect_spectator(conn.websocket, room_id),
+            codec=codec
+        )
+        connection.enqueue(encode_frame(self._timer_state_message(room)))
+        return connection
+    
+    def disconnect_spectator(self, websocket: WebSocket, room_id: str):
+        group = self.spectators.get(room_id)
+        if group is None:
+            return
+        connection = group.connections.pop(websocket, None)
+        if connection is not None:
+            connection.close()
+        if not group.connections:
+            if group.handle is not None:
+                group.handle.cancel()
+            del self.spectators[room_id]
+            if not self.active_connections.get(room_id):
+                self.evictor.mark_idle(room_id, time.time())
+    
+    def _notify_spectators(self, room_id: str):
+        """Sayaç değişti; izleyicilere en geç pencere sonunda güncel durum gider"""
+        group = self.spectators.get(room_id)
+        if group is None or group.handle is not None:
+            return
+        delay = max(0.0, group.sent_at + self.spectator_interval - time.monotonic())
+        group.handle = asyncio.get_running_loop().call_later(
+            delay, self.submit, room_id, self._flush_spectators, room_id)
+    
+    async def _flush_spectators(self, room_id: str):
+        group = self.spectators.get(room_id)
+        if group is None:
+            return
+        group.handle = None
+        room = self.room_states.get(room_id)
+        if room is None:
+            return
+        group.sent_at = time.monotonic()
+        # Aradaki olaylar ne olursa olsun tek, güncel bir durum çerçevesi yeterlidir
+        frame = encode_frame(self._timer_state_message(room))
+        for connection in list(group.connections.values()):
+            connection.enqueue(frame)
+        FRAMES_ENQUEUED.inc(len(group.connections))
+    
+    def _attach(self, websocket: WebSocket, room_id: str, participant: Participant,
+                codec: MessageCodec = JSON_CODEC) -> ClientConnection:
+        connection = self.active_connections[room_id][websocket] = ClientConnection(
+            websocket, participant,
+            on_error=lambda conn: self.disconnect(conn.websocket, room_id),
+            codec=codec
+        )
+        return connection
+    
+    def _open_session(self, room_id: str, participant: Participant, websocket: WebSocket):
+        token = secrets.token_urlsafe(16)
+        participant.resume_token = token
+        self._sessions[token] = ResumeSession(token, room_id, participant, websocket)
     
-    def disconnect(self, websocket: WebSocket, room_id: str):
-        """Kullanıcıyı odadan çıkarır"""
+    def _close_session(self, participant: Participant):
+        session = self._sessions.pop(participant.resume_token, None) if participant.resume_token else None
+        participant.resume_token = None
+        if session is not None and session.handle is not None:
+            session.handle.cancel()
+    
+    def disconnect(self, websocket: WebSocket, room_id: str, resumable: bool = True):
+        """
+        Kullanıcıyı odadan çıkarır. Soket hemen yayınlardan çıkarılır;
+        oda durumunun güncellenmesi odanın aktörüne bırakılır.
+        `resumable` ise katılımcı RESUME_GRACE süresi boyunca geri dönebilmesi için tutulur.
+        """
         if room_id in self.active_connections:
             if websocket in self.active_connections[room_id]:
-                user_info = self.active_connections[room_id][websocket]
-                user_name = user_info["name"]
-                
-                del self.active_connections[room_id][websocket]
-                
-                # Kullanıcı listesinden tamamen silmek yerine "online" durumunu değiştirebilirsiniz
-                # Ama şimdilik listeden siliyoruz:
-                if room_id in self.room_states:
-                    self.room_states[room_id]["users"] = [
-                        u for u in self.room_states[room_id]["users"]
-                        if u["id"] != user_info["id"]
-                    ]
-                
-                logger.info(f"Kullanıcı '{user_name}' '{room_id}' odasından ayrıldı")
-                
-                asyncio.create_task(self.broadcast_user_left(room_id, user_name))
-                asyncio.create_task(self.broadcast_user_list(room_id))
+                connection = self.active_connections[room_id].pop(websocket)
+                connection.close()
+                self._leaderboard_subscribers.pop(connection, None)
+                DISCONNECTS.inc()
+                self.submit(room_id, self._remove_participant, room_id, connection.participant, resumable)
+    
+    async def _remove_participant(self, room_id: str, participant: Participant, resumable: bool = False):
+        if not self.active_connections.get(room_id) and room_id not in self.spectators:
+            self.evictor.mark_idle(room_id, time.time())
+        
+        session = self._sessions.get(participant.resume_token) if participant.resume_token else None
+        if resumable and session is not None and self.resume_grace > 0:
+            # Kayıt listede kalır ama yokken puan toplamaz; süre dolarsa _expire_session kullanıcıyı çıkarır
+            session.websocket = None
+            if room_id in self.room_states:
+                self.room_states[room_id].set_away(participant, True)
+            session.handle = asyncio.get_running_loop().call_later(
+                self.resume_grace, self.submit, room_id, self._expire_session, session.token)
+            logger.info(f"Kullanıcı '{participant.name}' '{room_id}' odasından koptu; "
+                        f"{self.resume_grace:.0f} sn içinde dönebilir")
+            return
+        self._close_session(participant)
+        
+        # Kullanıcı listesinden tamamen silmek yerine "online" durumunu değiştirebilirsiniz
+        # Ama şimdilik listeden siliyoruz:
+        if room_id in self.room_states:
+            room = self.room_states[room_id]
+            room.remove_user(participant.id)
+            room.set_score(participant.name, participant.total_seconds)
+            if not room.users:
+                # Geri dönebilecek kimse kalmadı
+                room.history = None
+        self.publish("user_removed", room_id, user=participant.to_event())
+        
+        logger.info(f"Kullanıcı '{participant.name}' '{room_id}' odasından ayrıldı")
+        
+        await self.announce_left(room_id, participant)
+    
+    async def _expire_session(self, token: str):
+        session = self._sessions.get(token)
+        if session is None or session.websocket is not None:
+            return
+        if session.room_id not in self.room_states:
+            # Oda bu arada bellekten atıldı; puan zaten kalıcılık katmanında
+            self._close_session(session.participant)
+            return
+        await self._remove_participant(session.room_id, session.participant)
 
-    async def send_personal_message(self, message: dict, websocket: WebSocket):
-        try:
-            await websocket.send_json(message)
-        except Exception as e:
-            logger.error(f"Mesaj gönderme hatası: {e}")
+    async def send_personal_message(self, message: dict, websocket: WebSocket, room_id: str):
+        """Tek bir bağlantının kuyruğuna mesaj ekler (yayınlarla sıralama korunur)"""
+        frame = encode_frame(message)
+        connection = self.active_connections.get(room_id, {}).get(websocket)
+        if connection is None:
+            try:
+                await websocket.send_text(frame.data)
+            except Exception as e:
+                logger.error(f"Mesaj gönderme hatası: {e}")
+            return
+        connection.enqueue(frame)
     
     async def broadcast(self, message: dict, room_id: str, exclude_websocket: WebSocket = None):
-        if room_id not in self.active_connections:
+        """
+        Mesajı bir kez kodlar ve odadaki her bağlantının kuyruğuna ekler.
+        Gönderimi bağlantı başına yazıcı görevler yapar; burada hiçbir soket beklenmez.
+        """
+        if message.get("type") in TIMER_MESSAGE_TYPES and room_id in self.spectators:
+            self._notify_spectators(room_id)
+        if not self.active_connections.get(room_id):
             return
         
-        disconnected = []
-        for websocket in self.active_connections[room_id]:
-            if websocket != exclude_websocket:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    logger.error(f"Yayın hatası: {e}")
-                    disconnected.append(websocket)
+        started = time.perf_counter()
+        await self.broadcast_frame(encode_frame(message), room_id, exclude_websocket, started)
+    
+    async def broadcast_delta(self, message: dict, room_id: str):
+        """
+        Liste deltalarını numaralandırıp odanın geçmişine ekler ve yayınlar.
+        Yeniden bağlanan istemci kaçırdıklarını bu geçmişten alır.
+        """
+        room = self.room_states.get(room_id)
+        if room is None:
+            return
+        started = time.perf_counter()
+        room.seq += 1
+        message["seq"] = room.seq
+        frame = encode_frame(message)
+        room.record_delta(frame)
+        await self.broadcast_frame(frame, room_id, None, started)
+    
+    async def broadcast_frame(self, frame: Frame, room_id: str, exclude_websocket: WebSocket = None,
+                              started: Optional[float] = None):
+        """Kodlanmış çerçeveyi odadaki bağlantıların kuyruklarına ekler"""
+        connections = self.active_connections.get(room_id)
+        if not connections:
+            return
         
-        for ws in disconnected:
-            self.disconnect(ws, room_id)
+        if started is None:
+            started = time.perf_counter()
+        for websocket, connection in list(connections.items()):
+            if websocket != exclude_websocket:
+                connection.enqueue(frame)
+        BROADCASTS.inc()
+        FRAMES_ENQUEUED.inc(len(connections))
+        BROADCAST_SECONDS.observe(time.perf_counter() - started)
     
-    async def broadcast_user_joined(self, room_id: str, user_name: str, exclude_websocket: WebSocket):
-        message = {
-            "type": "user_joined",
-            "user_name": user_name,
-            "message": f"{user_name} odaya katıldı"
-        }
-        await self.broadcast(message, room_id, exclude_websocket)
+    async def announce_joined(self, room_id: str, participant: Participant, announce: bool = True):
+        """Katılımı odanın bekleyen presence mesajına ekler"""
+        self._presence_batch(room_id).add(participant, announce)
+        if self.presence_window <= 0:
+            await self.flush_presence(room_id)
     
-    async def broadcast_user_left(self, room_id: str, user_name: str):
-        message = {
-            "type": "user_left",
-            "user_name": user_name,
-            "message": f"{user_name} odadan ayrıldı"
-        }
-        await self.broadcast(message, room_id)
+    async def announce_left(self, room_id: str, participant: Participant):
+        """Ayrılmayı odanın bekleyen presence mesajına ekler"""
+        self._presence_batch(room_id).remove(participant)
+        if self.presence_window <= 0:
+            await self.flush_presence(room_id)
+    
+    def _presence_batch(self, room_id: str) -> PresenceBatch:
+        batch = self._presence.get(room_id)
+        if batch is None:
+            batch = self._presence[room_id] = PresenceBatch()
+            if self.presence_window > 0:
+                # Pencere sonunda gönderim de odanın aktöründe, diğer komutlarla sırayla yapılır
+                batch.handle = asyncio.get_running_loop().call_later(
+                    self.presence_window, self.submit, room_id, self.flush_presence, room_id)
+        return batch
+    
+    async def flush_presence(self, room_id: str):
+        """
+        Biriken katılma/ayrılmaları tek mesajla yayınlar. Sıra değişikliği (rank_changed)
+        göndermeden önce de çağrılır; istemci sıraları her zaman güncel listeye uygular.
+        """
+        batch = self._presence.pop(room_id, None)
+        if batch is None:
+            return
+        if batch.handle is not None:
+            batch.handle.cancel()
+        room = self.room_states.get(room_id)
+        if room is None:
+            return
+        await self.broadcast_delta(batch.to_message(room), room_id)
     
-    async def broadcast_user_list(self, room_id: str):
-        """Kullanıcı listesini PUANA GÖRE SIRALAYIP gönderir"""
+    async def send_user_list(self, websocket: WebSocket, room_id: str):
+        """Kullanıcı listesini PUANA GÖRE SIRALI şekilde tek bir bağlantıya gönderir"""
         if room_id not in self.room_states:
             return
         
-        users = self.room_states[room_id]["users"]
-        
-        # Puanı (total_seconds) yüksek olanı en başa al (reverse=True)
-        # get("total_seconds", 0) kullanımı eski veriler varsa hata almamak için
-        sorted_users = sorted(users, key=lambda x: x.get("total_seconds", 0), reverse=True)
-        
-        user_list = [
-            {
-                "name": user["name"], 
-                "id": user["id"],
-                "total_seconds": user.get("total_seconds", 0) # Frontend'e puanı gönder
-            }
-            for user in sorted_users
-        ]
-        
+        room = self.room_states[room_id]
         message = {
             "type": "user_list_update",
-            "users": user_list
+            "users": room.leaderboard(),
+            "seq": room.seq
         }
         
-        if room_id in self.active_connections:
-            disconnected = []
-            for websocket in self.active_connections[room_id]:
-                try:
-                    await websocket.send_json(message)
-                except Exception as e:
-                    disconnected.append(websocket)
-            
-            for ws in disconnected:
-                self.disconnect(ws, room_id)
+        await self.send_personal_message(message, websocket, room_id)
+    
+    async def send_session(self, websocket: WebSocket, room_id: str, participant: Participant, resumed: bool):
+        """Yeniden bağlanma için token'ı ve önerilen bekleme aralığını gönderir"""
+        message = {
+            "type": "session",
+            "participant_id": participant.id,
+            "resume_token": participant.resume_token,
+            "resumed": resumed,
+            "resume_grace": self.resume_grace,
+            # İstemci bekleme süresini bu aralıkta rastgele seçer; toplu kopmalarda dönüşler yayılır
+            "reconnect": {
+                "base_ms": int(RECONNECT_BASE_DELAY * 1000),
+                "max_ms": int(RECONNECT_MAX_DELAY * 1000)
+            }
+        }
+        await self.send_personal_message(message, websocket, room_id)
+    
+    def send_time_sync(self, connection: ClientConnection, t0, received_ms: int):
+        """
+        NTP tarzı saat eşitleme yanıtı: istemcinin gönderim zamanı (t0, istemci saati),
+        sunucunun alış (t1) ve gönderim (t2) zamanları (sunucu saati, ms).
+        Oda durumuna dokunmadığı için odanın aktörüne uğramadan doğrudan kuyruğa eklenir.
+        """
+        if not isinstance(t0, (int, float)) or isinstance(t0, bool):
+            return
+        connection.enqueue(encode_frame({
+            "type": "time_sync",
+            "t0": t0,
+            "t1": received_ms,
+            "t2": server_now_ms()
+        }))
+    
+    def subscribe_leaderboard(self, connection: ClientConnection, limit=None):
+        """
+        Bağlantıya genel tablonun ilk `limit` satırını gönderir; sonrasında yalnızca bu pencereye giren,
+        içinde yeri değişen ya da pencereden çıkan (rank None) satırlar gider.
+        """
+        if not isinstance(limit, int) or isinstance(limit, bool) or limit <= 0:
+            limit = self.leaderboard.size
+        entries = self.leaderboard.entries(0, limit)
+        self._leaderboard_subscribers[connection] = limit
+        self._leaderboard_windows.setdefault(limit, {entry["name"] for entry in entries})
+        connection.enqueue(encode_frame({
+            "type": "leaderboard",
+            "size": self.leaderboard.size,
+            "entries": entries
+        }))
+    
+    def unsubscribe_leaderboard(self, connection: ClientConnection):
+        self._leaderboard_subscribers.pop(connection, None)
+    
+    def update_leaderboard(self, earned: Dict[str, int]):
+        """Kazanılan puanları genel tabloya ekler; abonelere değişiklikler pencere sonunda tek mesajla gider"""
+        changed = self.leaderboard.add(earned)
+        if not self._leaderboard_subscribers:
+            self._leaderboard_windows.clear()
+            return
+        if not changed:
+            return
+        self._leaderboard_pending.update(changed)
+        if self._leaderboard_task is None:
+            self._leaderboard_task = asyncio.create_task(self._flush_leaderboard())
+    
+    async def _flush_leaderboard(self):
+        await asyncio.sleep(GLOBAL_LEADERBOARD_WINDOW)
+        names, self._leaderboard_pending = self._leaderboard_pending, set()
+        self._leaderboard_task = None
+        for connection in [c for c in self._leaderboard_subscribers if c.closed]:
+            del self._leaderboard_subscribers[connection]
+        # Aynı limitli aboneler aynı çerçeveyi paylaşır
+        by_limit: Dict[int, List[ClientConnection]] = {}
+        for connection, limit in self._leaderboard_subscribers.items():
+            by_limit.setdefault(limit, []).append(connection)
+        windows, self._leaderboard_windows = self._leaderboard_windows, {}
+        for limit, connections in by_limit.items():
+            window = {entry["name"] for entry in self.leaderboard.entries(0, limit)}
+            old_window = windows.get(limit, window)
+            self._leaderboard_windows[limit] = window
+            # Pencerede değişenler ile (başkası tarafından itilenler dahil) pencereden çıkanlar
+            changes = self.leaderboard.changes((names & window) | (old_window - window))
+            if not changes:
+                continue
+            for change in changes:
+                if change["rank"] is not None and change["rank"] > limit:
+                    change["rank"] = None
+            frame = encode_frame({"type": "leaderboard_changed", "changes": changes})
+            for connection in connections:
+                connection.enqueue(frame)
     
     async def send_current_state(self, websocket: WebSocket, room_id: str):
-        """Yeni bağlanan kullanıcıya mevcut timer durumunu gönderir (UTC FIX)"""
+        """Yeni bağlanan kullanıcıya mevcut timer durumunu gönderir"""
         if room_id not in self.room_states:
             return
         
-        timer_state = self.room_states[room_id]["timer"]
-        settings = self.room_states[room_id]["settings"]
-        
-        remaining = timer_state["remaining_seconds"]
-        target_ts = timer_state["target_timestamp"]
-        
-        if timer_state["is_running"] and target_ts:
-            try:
-                target_time = datetime.fromisoformat(target_ts)
-                now = datetime.now(timezone.utc) # UTC Fix
-                remaining = max(0, int((target_time - now).total_seconds()))
-            except Exception as e:
-                logger.error(f"Timestamp hesaplama hatası: {e}")
-                remaining = timer_state["remaining_seconds"]
-        
-        message = {
+        message = self._timer_state_message(self.room_states[room_id])
+        await self.send_personal_message(message, websocket, room_id)
+    
+    def _timer_state_message(self, room: Room) -> dict:
+        timer_state = room.timer
+        return {
             "type": "timer_state",
-            "remaining_seconds": remaining,
-            "is_running": timer_state["is_running"],
-            "target_timestamp": target_ts,
-            "mode": timer_state["mode"],
-            "settings": settings
+            "remaining_seconds": timer_state.remaining_at(time.time()),
+            "is_running": timer_state.is_running,
+            "target_timestamp": format_timestamp(timer_state.target_timestamp),
+            "ends_at": server_deadline_ms(timer_state.target_timestamp),
+            "mode": timer_state.mode,
+            "settings": room.settings.to_dict()
         }
-        
-        await self.send_personal_message(message, websocket)
     
     async def start_timer(self, room_id: str):
         if room_id not in self.room_states:
             return
         
-        timer_state = self.room_states[room_id]["timer"]
-        if timer_state["is_running"]:
+        room = self.room_states[room_id]
+        timer_state = room.timer
+        if timer_state.is_running:
             return
         
-        remaining = timer_state["remaining_seconds"]
-        
-        # --- PUANLAMA İÇİN BAŞLANGIÇ GÜNCELLEMESİ ---
-        # Timer başlarken odadaki herkesin "session_start" zamanını güncelle
-        now = datetime.now(timezone.utc)
-        for user in self.room_states[room_id]["users"]:
-            user["current_session_start"] = now.isoformat()
-        # -------------------------------------------
-
-        # Eğer target_timestamp varsa ve geçmişteyse kontrolü
-        if timer_state["target_timestamp"]:
-            try:
-                target_time = datetime.fromisoformat(timer_state["target_timestamp"])
-                if target_time > now:
-                    remaining = int((target_time - now).total_seconds())
-                else:
-                    remaining = 0
-            except:
-                pass
+        # Timer başlarken odadaki herkesin "session_start" zamanını güncelle (puanlama için)
+        now = time.time()
+        room.set_session_start(now)
         
-        # Target timestamp hesapla
-        target_time = now + timedelta(seconds=remaining)
-        target_timestamp = target_time.isoformat()
+        remaining = timer_state.remaining_seconds
+        target_timestamp = now + remaining
         
-        timer_state["is_running"] = True
-        timer_state["target_timestamp"] = target_timestamp
-        timer_state["remaining_seconds"] = remaining
+        timer_state.is_running = True
+        timer_state.target_timestamp = target_timestamp
+        timer_state.remaining_seconds = remaining
+        self.scheduler.schedule(room_id, target_timestamp)
+        self.store.mark_dirty(room)
         
         message = {
             "type": "timer_started",
             "remaining_seconds": remaining,
-            "target_timestamp": target_timestamp,
+            "target_timestamp": format_timestamp(target_timestamp),
+            "ends_at": server_deadline_ms(target_timestamp),
             "is_running": True,
-            "mode": timer_state["mode"]
+            "mode": timer_state.mode
         }
+        self.publish("timer", room_id, state=room.timer_snapshot(), session_start=now, message=message)
         await self.broadcast(message, room_id)
     
     async def stop_timer(self, room_id: str):
         if room_id not in self.room_states:
             return
         
-        timer_state = self.room_states[room_id]["timer"]
-        if not timer_state["is_running"]:
+        room = self.room_states[room_id]
+        timer_state = room.timer
+        if not timer_state.is_running:
             return
         
-        remaining = timer_state["remaining_seconds"]
-        if timer_state["target_timestamp"]:
-            try:
-                target_time = datetime.fromisoformat(timer_state["target_timestamp"])
-                now = datetime.now(timezone.utc)
-                remaining = max(0, int((target_time - now).total_seconds()))
-            except:
-                pass
+        remaining = timer_state.remaining_at(time.time())
         
         # Timer durduğunda session start'ı sıfırla ki hatalı hesap olmasın
-        for user in self.room_states[room_id]["users"]:
-            user["current_session_start"] = None
+        room.set_session_start(None)
 
-        timer_state["is_running"] = False
-        timer_state["remaining_seconds"] = remaining
-        timer_state["target_timestamp"] = None
+        timer_state.is_running = False
+        timer_state.remaining_seconds = remaining
+        timer_state.target_timestamp = None
+        self.scheduler.cancel(room_id)
+        self.store.mark_dirty(room)
         
         message = {
             "type": "timer_stopped",
             "remaining_seconds": remaining,
             "is_running": False,
-            "mode": timer_state["mode"]
+            "mode": timer_state.mode
         }
+        self.publish("timer", room_id, state=room.timer_snapshot(), session_start=None, message=message)
         await self.broadcast(message, room_id)
 
     async def finish_timer_and_reward(self, room_id: str):
@@ -329,57 +2764,57 @@ class ConnectionManager:
         """
         if room_id not in self.room_states:
             return
-            
-        timer_state = self.room_states[room_id]["timer"]
+        
+        room = self.room_states[room_id]
+        timer_state = room.timer
         
         # Sadece timer çalışıyorsa puan ver
-        if not timer_state["is_running"]:
+        if not timer_state.is_running:
             return
 
-        mode = timer_state["mode"]
-        settings = self.room_states[room_id]["settings"]
+        mode = timer_state.mode
         
         # O seansın maksimum süresi (örn: 25 dk = 1500 sn)
-        max_duration = 0
-        if mode == "work":
-            max_duration = settings["work_duration"]
-        elif mode == "short_break":
-            max_duration = settings["short_break"]
-        elif mode == "long_break":
-            max_duration = settings["long_break"]
-
-        now = datetime.now(timezone.utc)
-            
-        # Her kullanıcı için özel hesaplama yap
-        for user in self.room_states[room_id]["users"]:
-            # Eğer kullanıcının bir başlangıç zamanı varsa hesapla
-            if user.get("current_session_start"):
-                try:
-                    start_time = datetime.fromisoformat(user["current_session_start"])
-                    # Kullanıcının içeride kaldığı süre (saniye)
-                    elapsed_seconds = int((now - start_time).total_seconds())
-                    
-                    # Kullanıcı en fazla timer süresi kadar puan alabilir
-                    earned_seconds = min(elapsed_seconds, max_duration)
-                    earned_seconds = max(0, earned_seconds)
-                    
-                    # Puanı ekle (Sadece work modunda veya hepsinde, tercihe bağlı)
-                    # Şimdilik hepsinde ekliyoruz:
-                    user["total_seconds"] = user.get("total_seconds", 0) + earned_seconds
-                        
-                except Exception as e:
-                    logger.error(f"Puan hesaplama hatası: {e}")
-            
-            # Bir sonraki tur için başlangıç zamanını sıfırla
-            user["current_session_start"] = None
+        max_duration = room.settings.duration_for(mode)
+
+        now = time.time()
+        rewarded = []
+        earned: Dict[str, int] = {}
             
-        # Timer'ı durdur ve sıfırla
-        timer_state["is_running"] = False
-        timer_state["target_timestamp"] = None
-        timer_state["remaining_seconds"] = 0 # Sıfıra çek
+        # Kullanıcının içeride kaldığı süre (en fazla timer süresi kadar) tüm oda için sütun üzerinde
+        # tek seferde hesaplanır ve oturum başlangıçları sıfırlanır; döngü yalnızca puan alanlar içindir.
+        # (Şimdilik tüm modlarda puan veriyoruz)
+        try:
+            for user, earned_seconds, session_start in room.finish_sessions(now, max_duration):
+                rewarded.append(user)
+                total_seconds = user.total_seconds
+                room.set_score(user.name, total_seconds)
+                self.store.record_score(room_id, user.name, total_seconds)
+                self.store.record_session(room_id, user.name, mode, session_start, now, earned_seconds)
+                earned[user.name] = earned.get(user.name, 0) + earned_seconds
+        except Exception as e:
+            logger.error(f"Puan hesaplama hatası ({room_id}): {e}")
+        finally:
+            # Puanlama hata verse bile timer'ı durdur ve sıfırla; aksi halde oda çalışır halde takılı kalır
+            self.scheduler.cancel(room_id)
+            timer_state.is_running = False
+            timer_state.target_timestamp = None
+            timer_state.remaining_seconds = 0 # Sıfıra çek
+            self.store.mark_dirty(room)
         
-        # Puanlar değiştiği için listeyi GÜNCELLE (Sıralı şekilde gider)
-        await self.broadcast_user_list(room_id)
+        # Diğer worker'lar da kendi kullanıcılarını puanlar; bizimkilerin yeni puanlarını onlara bildir
+        if rewarded:
+            self.publish("scores", room_id, users=[user.to_event() for user in rewarded], earned=earned)
+            self.update_leaderboard(earned)
+        
+        # Yalnızca puanı değişen kullanıcıların yeni sırasını gönder
+        await self.flush_presence(room_id)
+        changes = room.update_ranks(rewarded)
+        if changes:
+            await self.broadcast_delta({
+                "type": "rank_changed",
+                "changes": changes
+            }, room_id)
         
         # Timer'ın bittiğini bildir
         message = {
@@ -388,31 +2823,36 @@ class ConnectionManager:
         }
         await self.broadcast(message, room_id)
     
+    async def handle_client_completion(self, room_id: str):
+        """
+        İstemcinin "timer_completed" sinyali. Odadaki her istemci aynı anda gönderdiği için
+        yalnızca sunucudaki bitiş zamanı gerçekten geçmişse ve oda hâlâ çalışıyorsa işlenir;
+        diğer kopyalar tek bir sözlük okumasıyla yok sayılır.
+        """
+        deadline = self.scheduler.deadline(room_id)
+        if deadline is None or deadline > time.time():
+            return
+        self.scheduler.cancel(room_id)
+        await self.finish_timer_and_reward(room_id)
+    
     async def reset_timer(self, room_id: str, mode: str = "work"):
         """Timer'ı sıfırlar"""
         if room_id not in self.room_states:
             return
         
-        timer_state = self.room_states[room_id]["timer"]
-        settings = self.room_states[room_id]["settings"]
-        
-        if mode == "work":
-            duration = settings["work_duration"]
-        elif mode == "short_break":
-            duration = settings["short_break"]
-        elif mode == "long_break":
-            duration = settings["long_break"]
-        else:
-            duration = settings["work_duration"]
+        room = self.room_states[room_id]
+        timer_state = room.timer
+        duration = room.settings.duration_for(mode)
             
         # Session startları sıfırla
-        for user in self.room_states[room_id]["users"]:
-            user["current_session_start"] = None
+        room.set_session_start(None)
         
-        timer_state["remaining_seconds"] = duration
-        timer_state["is_running"] = False
-        timer_state["target_timestamp"] = None
-        timer_state["mode"] = mode
+        self.scheduler.cancel(room_id)
+        timer_state.remaining_seconds = duration
+        timer_state.is_running = False
+        timer_state.target_timestamp = None
+        timer_state.mode = mode
+        self.store.mark_dirty(room)
         
         message = {
             "type": "timer_reset",
@@ -420,48 +2860,369 @@ class ConnectionManager:
             "is_running": False,
             "mode": mode
         }
+        self.publish("timer", room_id, state=room.timer_snapshot(), session_start=None, message=message)
         await self.broadcast(message, room_id)
     
     async def update_settings(self, room_id: str, work_duration: int, short_break: int, long_break: int):
         if room_id not in self.room_states:
             return
         
-        settings = self.room_states[room_id]["settings"]
-        settings["work_duration"] = work_duration
-        settings["short_break"] = short_break
-        settings["long_break"] = long_break
+        room = self.room_states[room_id]
+        settings = room.settings
+        # Boş bırakılan alan istemciden null gelir; geçersiz süreler eski değeri korur
+        settings.work_duration = valid_duration(work_duration, settings.work_duration)
+        settings.short_break = valid_duration(short_break, settings.short_break)
+        settings.long_break = valid_duration(long_break, settings.long_break)
         
-        timer_state = self.room_states[room_id]["timer"]
-        if not timer_state["is_running"]:
-            if timer_state["mode"] == "work":
-                timer_state["remaining_seconds"] = work_duration
-            elif timer_state["mode"] == "short_break":
-                timer_state["remaining_seconds"] = short_break
-            elif timer_state["mode"] == "long_break":
-                timer_state["remaining_seconds"] = long_break
+        timer_state = room.timer
+        if not timer_state.is_running:
+            timer_state.remaining_seconds = settings.duration_for(timer_state.mode)
+        self.store.mark_dirty(room)
         
         message = {
             "type": "settings_updated",
-            "settings": settings,
-            "remaining_seconds": timer_state["remaining_seconds"],
-            "mode": timer_state["mode"]
+            "settings": settings.to_dict(),
+            "remaining_seconds": timer_state.remaining_seconds,
+            "mode": timer_state.mode
         }
+        self.publish("timer", room_id, state=room.timer_snapshot(), message=message)
         await self.broadcast(message, room_id)
+    
+    # --- Worker'lar arası olaylar ---
+    
+    async def handle_backplane_event(self, event: dict):
+        """Başka bir worker'dan gelen oda olayını odanın aktörüne verir"""
+        if event.get("origin") == self.worker_id:
+            return
+        # Genel liderlik tablosu odadan bağımsızdır; oda bu worker'da açık olmasa da güncellenir
+        if event.get("kind") == "scores":
+            self.update_leaderboard(event.get("earned") or {})
+        room_id = event.get("room")
+        if room_id not in self.room_states:
+            # Bu worker'da açık olmayan odalar yok sayılır
+            return
+        self.submit(room_id, self._apply_backplane_event, event)
+    
+    async def _apply_backplane_event(self, event: dict):
+        """Başka bir worker'dan gelen oda olayını bu worker'daki kopyaya uygular"""
+        room = self.room_states.get(event["room"])
+        if room is None:
+            return
+        
+        kind = event.get("kind")
+        if kind == "timer":
+            await self._apply_remote_timer(room, event)
+        elif kind == "user_added":
+            await self._apply_remote_user_added(room, event["user"], event.get("sync", False))
+        elif kind == "user_removed":
+            await self._apply_remote_user_removed(room, event["user"])
+        elif kind == "scores":
+            await self._apply_remote_scores(room, event["users"])
+        elif kind == "hello":
+            self._answer_hello(room)
+    
+    async def _apply_remote_timer(self, room: Room, event: dict):
+        room.apply_timer_snapshot(event["state"])
+        timer_state = room.timer
+        if timer_state.is_running and timer_state.target_timestamp is not None:
+            self.scheduler.schedule(room.room_id, timer_state.target_timestamp)
+        else:
+            self.scheduler.cancel(room.room_id)
+        # "session_start" yalnızca başlatma/durdurma olaylarında bulunur
+        if "session_start" in event:
+            room.set_session_start(event["session_start"])
+        elif timer_state.is_running:
+            # Bu worker'a sayaç çalışırken (ama henüz haberi yokken) katılanlar şimdiden sayılır
+            room.set_session_start(time.time(), only_missing=True)
+        
+        message = event.get("message")
+        if message:
+            if "ends_at" in message:
+                # Sunucu saati süreçe özeldir; bitiş anı bu worker'ın saatine göre yeniden hesaplanır
+                message["ends_at"] = server_deadline_ms(timer_state.target_timestamp)
+            await self.broadcast(message, room.room_id)
+    
+    async def _apply_remote_user_added(self, room: Room, data: dict, sync: bool):
+        if data["id"] in room.users:
+            return
+        participant = Participant(data["name"], participant_id=data["id"], joined_at=data["joined_at"],
+                                  total_seconds=data["total_seconds"], remote=True)
+        room.add_user(participant)
+        # Yeni açılan odaya gönderilen mevcut kullanıcılar (sync) katılım olarak duyurulmaz
+        await self.announce_joined(room.room_id, participant, announce=not sync)
+    
+    async def _apply_remote_user_removed(self, room: Room, data: dict):
+        participant = room.remove_user(data["id"])
+        if participant is None:
+            return
+        room.set_score(participant.name, data["total_seconds"])
+        await self.announce_left(room.room_id, participant)
+    
+    async def _apply_remote_scores(self, room: Room, users: List[dict]):
+        updated = []
+        for data in users:
+            room.set_score(data["name"], data["total_seconds"])
+            participant = room.users.get(data["id"])
+            if participant is not None and participant.remote:
+                participant.total_seconds = data["total_seconds"]
+                updated.append(participant)
+        
+        await self.flush_presence(room.room_id)
+        changes = room.update_ranks(updated)
+        if changes:
+            await self.broadcast_delta({
+                "type": "rank_changed",
+                "changes": changes
+            }, room.room_id)
+    
+    def _answer_hello(self, room: Room):
+        """Odayı yeni açan worker'a bu worker'daki kullanıcıları ve güncel sayacı gönderir"""
+        for participant in room.users.values():
+            if not participant.remote:
+                self.publish("user_added", room.room_id, user=participant.to_event(), sync=True)
+        
+        timer_state = room.timer
+        message = {
+            "type": "timer_state",
+            "remaining_seconds": timer_state.remaining_at(time.time()),
+            "is_running": timer_state.is_running,
+            "target_timestamp": format_timestamp(timer_state.target_timestamp),
+            "ends_at": None,
+            "mode": timer_state.mode,
+            "settings": room.settings.to_dict()
+        }
+        self.publish("timer", room.room_id, state=room.timer_snapshot(), message=message)
 
 
 # Global ConnectionManager instance
-manager = ConnectionManager()
+manager = ConnectionManager(store=create_store_from_env(), backplane=create_backplane_from_env())
+
+metrics.gauge("pomodoro_rooms_live", "Bellekteki odalar", lambda: len(manager.room_states))
+metrics.gauge("pomodoro_rooms_idle", "Bağlantısı kalmamış (tahliye bekleyen) odalar", lambda: len(manager.evictor))
+metrics.counter("pomodoro_rooms_evicted_ttl_total", "Süresi dolduğu için atılan odalar",
+                lambda: manager.evictor.evicted_ttl)
+metrics.counter("pomodoro_rooms_evicted_lru_total", "Oda sınırı nedeniyle atılan odalar",
+                lambda: manager.evictor.evicted_lru)
+metrics.gauge("pomodoro_connections", "Açık WebSocket bağlantıları",
+              lambda: sum(len(connections) for connections in manager.active_connections.values()))
+metrics.gauge("pomodoro_spectators", "Açık izleyici bağlantıları",
+              lambda: sum(len(group.connections) for group in manager.spectators.values()))
+metrics.gauge("pomodoro_scheduled_timers", "Zamanlayıcıdaki çalışan odalar", lambda: len(manager.scheduler))
+
+_background_tasks: List[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def startup_event():
+    await manager.start()
+    _background_tasks.append(asyncio.create_task(monitor_event_loop_lag()))
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in _background_tasks:
+        task.cancel()
+    _background_tasks.clear()
+    await manager.stop()
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {"status": "ok", "rooms": manager.room_stats()}
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/protocol")
+async def protocol_info():
+    """İkili kodlama kullanan istemciler için alt protokoller ve sayı kodu tabloları"""
+    return {
+        "subprotocols": [codec.subprotocol for codec in CODECS.values()],
+        "types": MESSAGE_TYPE_CODES,
+        "fields": FIELD_CODES,
+        "timestamp_fields": sorted(TIMESTAMP_FIELDS)
+    }
+
+
+@app.get("/leaderboard")
+async def global_leaderboard(limit: int = 50, offset: int = 0, name: Optional[str] = None):
+    """
+    Tüm odalar genelinde en iyi GLOBAL_LEADERBOARD_SIZE kullanıcı (sıra 1'den başlar).
+    `name` verilirse o kullanıcının toplamı ve (listedeyse) sırası da döner.
+    """
+    board = manager.leaderboard
+    limit = max(1, min(limit, max(1, board.size)))
+    offset = max(0, offset)
+    response = {"size": board.size, "entries": board.entries(offset, limit)}
+    if name is not None:
+        response["user"] = {"name": name, "total_seconds": board.totals.get(name, 0), "rank": board.rank_of(name)}
+    return response
+
+
+# --- Oturum istatistikleri ---
+# Liderlik tabloları artımlı tutulan özetlerden okunur; sayfalama (skor, isim) anahtarlı imleçle yapılır.
+
+def _stats_bucket_for(period: str, date: Optional[str]) -> str:
+    if period not in STATS_PERIODS:
+        raise HTTPException(status_code=400, detail=f"period şunlardan biri olmalı: {', '.join(STATS_PERIODS)}")
+    if date is None:
+        return stats_bucket(period, time.time())
+    try:
+        moment = datetime.strptime(date, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="date YYYY-MM-DD biçiminde olmalı")
+    return stats_bucket(period, moment.timestamp())
+
+
+def _encode_cursor(rank: int, seconds: int, user_name: str) -> str:
+    raw = json.dumps([rank, seconds, user_name], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, Tuple[int, str]]:
+    try:
+        rank, seconds, user_name = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return int(rank), (int(seconds), str(user_name))
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Geçersiz cursor")
+
+
+def _leaderboard_entries(rows: List[tuple], rank: int) -> List[dict]:
+    return [
+        {"rank": rank + index, "name": user_name, "total_seconds": seconds, "sessions": sessions}
+        for index, (user_name, seconds, sessions) in enumerate(rows, start=1)
+    ]
+
+
+@app.get("/stats/leaderboard")
+async def stats_leaderboard(period: str = "week", date: Optional[str] = None, room_id: str = "",
+                            limit: int = 50, cursor: Optional[str] = None):
+    """
+    Gün/hafta/tüm zamanlar liderlik tablosunun bir sayfası (room_id boşsa tüm odalar).
+    Sonraki sayfa için yanıttaki `next_cursor` gönderilir.
+    """
+    bucket = _stats_bucket_for(period, date)
+    limit = max(1, min(limit, STATS_PAGE_LIMIT))
+    rank, after = _decode_cursor(cursor) if cursor else (0, None)
+    rows = await manager.store.leaderboard(period, bucket, room_id, limit, after)
+    next_cursor = None
+    if len(rows) == limit:
+        user_name, seconds, _ = rows[-1]
+        next_cursor = _encode_cursor(rank + len(rows), seconds, user_name)
+    return {
+        "period": period,
+        "bucket": bucket,
+        "room_id": room_id or None,
+        "entries": _leaderboard_entries(rows, rank),
+        "next_cursor": next_cursor
+    }
+
+
+@app.get("/stats/leaderboard/stream")
+async def stats_leaderboard_stream(period: str = "week", date: Optional[str] = None, room_id: str = ""):
+    """Liderlik tablosunun tamamı, satır başına bir JSON (NDJSON); STATS_PAGE_LIMIT'lik sayfalarla akar"""
+    bucket = _stats_bucket_for(period, date)
+
+    async def lines():
+        rank, after = 0, None
+        while True:
+            rows = await manager.store.leaderboard(period, bucket, room_id, STATS_PAGE_LIMIT, after)
+            if rows:
+                yield "".join(json_encoder(entry) + "\n" for entry in _leaderboard_entries(rows, rank))
+            if len(rows) < STATS_PAGE_LIMIT:
+                return
+            rank += len(rows)
+            after = (rows[-1][1], rows[-1][0])
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.get("/stats/users/{user_name}")
+async def stats_user(user_name: str, period: str = "day", room_id: str = "", limit: int = 30):
+    """Kullanıcının son `limit` gün/hafta için odak süresi (room_id boşsa tüm odalar)"""
+    _stats_bucket_for(period, None)
+    limit = max(1, min(limit, STATS_PAGE_LIMIT))
+    rows = await manager.store.user_history(user_name, period, room_id, limit)
+    return {
+        "name": user_name,
+        "period": period,
+        "room_id": room_id or None,
+        "buckets": [
+            {"bucket": bucket, "total_seconds": seconds, "sessions": sessions}
+            for bucket, seconds, sessions in rows
+        ]
+    }
+
+
+# --- Sayfa önbelleği ---
+# Sayfa oda id'sinden bağımsızdır (istemci odayı adresten okur); bu yüzden bir kez render edilip
+# ham, gzip ve (brotli kuruluysa) brotli sürümleriyle bellekte tutulur ve her odada aynı ETag ile sunulur.
+PAGE_CACHE_CONTROL = os.environ.get("PAGE_CACHE_CONTROL", "public, max-age=60")
+
+
+class CachedPage:
+    """Önceden sıkıştırılmış sayfa sürümleri: kodlama -> (gövde, ETag)"""
+
+    __slots__ = ("variants",)
+
+    def __init__(self, body: bytes):
+        digest = hashlib.sha1(body).hexdigest()[:20]
+        self.variants: Dict[str, Tuple[bytes, str]] = {
+            "identity": (body, f'"{digest}"'),
+            "gzip": (gzip.compress(body, compresslevel=9, mtime=0), f'"{digest}-gz"'),
+        }
+        if brotli is not None:
+            self.variants["br"] = (brotli.compress(body, quality=11), f'"{digest}-br"')
+
+    def choose(self, accept_encoding: str) -> str:
+        """İstemcinin kabul ettiği (q > 0) en küçük sürümü seçer"""
+        accepted = set()
+        for part in accept_encoding.split(","):
+            token, _, params = part.partition(";")
+            params = params.replace(" ", "")
+            if params.startswith("q="):
+                try:
+                    if float(params[2:]) <= 0:
+                        continue
+                except ValueError:
+                    continue
+            accepted.add(token.strip().lower())
+        for encoding in ("br", "gzip"):
+            if encoding in accepted and encoding in self.variants:
+                return encoding
+        return "identity"
+
+    def response(self, request: Request) -> HTMLResponse:
+        encoding = self.choose(request.headers.get("accept-encoding", ""))
+        body, etag = self.variants[encoding]
+        headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL, "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match and (if_none_match.strip() == "*" or etag in
+                              (tag.strip().removeprefix("W/") for tag in if_none_match.split(","))):
+            return HTMLResponse(status_code=304, headers=headers)
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return HTMLResponse(body, headers=headers)
+
+
+_index_page: Optional[CachedPage] = None
+
+
+def index_page() -> CachedPage:
+    """Ana sayfayı ilk istekte render edip önbelleğe alır"""
+    global _index_page
+    if _index_page is None:
+        _index_page = CachedPage(templates.get_template("index.html").render().encode("utf-8"))
+    return _index_page
 
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
     try:
-        return templates.TemplateResponse("index.html", {"request": request})
+        return index_page().response(request)
     except Exception as e:
         logger.error(f"Template hatası: {e}")
         raise HTTPException(status_code=500, detail=f"Template yükleme hatası: {str(e)}")
@@ -470,7 +3231,7 @@ async def read_root(request: Request):
 @app.get("/room/{room_id}", response_class=HTMLResponse)
 async def read_room(request: Request, room_id: str):
     try:
-        return templates.TemplateResponse("index.html", {"request": request, "room_id": room_id})
+        return index_page().response(request)
     except Exception as e:
         logger.error(f"Template hatası: {e}")
         raise HTTPException(status_code=500, detail=f"Template yükleme hatası: {str(e)}")
@@ -479,34 +3240,86 @@ async def read_room(request: Request, room_id: str):
 @app.websocket("/ws/{room_id}")
 async def websocket_endpoint(websocket: WebSocket, room_id: str):
     user_name = None
+    resumable = True
+    spectator = False
     try:
-        await websocket.accept()
-        data = await websocket.receive_json()
+        # Kodlama alt protokolle seçilir: "pomodoro.msgpack" isteyen istemci ikili çerçeve alır
+        codec = negotiate_codec(websocket)
+        await websocket.accept(subprotocol=codec.subprotocol)
+        data = await codec.receive(websocket)
         user_name = data.get("user_name", "Anonim")
+        # Yeniden bağlanan istemci önceki oturumun token'ını ve aldığı son delta numarasını gönderir
+        resume_token = data.get("resume_token")
+        last_seq = data.get("last_seq")
+        if not isinstance(resume_token, str):
+            resume_token = None
+        if not isinstance(last_seq, int) or isinstance(last_seq, bool):
+            last_seq = None
         
-        await manager.connect(websocket, room_id, user_name)
+        # İzleyici ("spectator": true) katılımcı olmaz; yalnızca seyreltilmiş sayaç durumunu alır
+        spectator = data.get("spectator") is True
+        
+        # Odanın tüm durum değişiklikleri odanın aktöründe sırayla çalışır
+        if spectator:
+            connection = await manager.call(room_id, manager.connect_spectator, websocket, room_id, codec)
+        else:
+            connection = await manager.call(room_id, manager.connect, websocket, room_id, user_name,
+                                            resume_token, last_seq, codec)
         
         while True:
             try:
-                data = await websocket.receive_json()
+                data = await codec.receive(websocket)
+                if not connection.allow_inbound(time.monotonic()):
+                    INBOUND_LIMITED.inc()
+                    if connection.rate_limited >= INBOUND_BURST:
+                        logger.warning(f"Hız sınırını aşan bağlantı kapatılıyor ({room_id})")
+                        resumable = False
+                        await manager.close_socket(websocket, code=1008)
+                        break
+                    continue
                 message_type = data.get("type")
+                started = time.perf_counter()
                 
-                if message_type == "start_timer":
-                    await manager.start_timer(room_id)
+                if spectator and message_type not in SPECTATOR_MESSAGE_TYPES:
+                    # İzleyiciler salt okunurdur; oda komutları yok sayılır
+                    pass
+                elif message_type == "start_timer":
+                    await manager.call(room_id, manager.start_timer, room_id)
                 elif message_type == "stop_timer":
-                    await manager.stop_timer(room_id)
+                    await manager.call(room_id, manager.stop_timer, room_id)
                 elif message_type == "reset_timer":
                     mode = data.get("mode", "work")
-                    await manager.reset_timer(room_id, mode)
+                    await manager.call(room_id, manager.reset_timer, room_id, mode)
                 elif message_type == "update_settings":
                     work_duration = data.get("work_duration", DEFAULT_WORK_DURATION)
                     short_break = data.get("short_break", DEFAULT_SHORT_BREAK)
                     long_break = data.get("long_break", DEFAULT_LONG_BREAK)
-                    await manager.update_settings(room_id, work_duration, short_break, long_break)
+                    await manager.call(room_id, manager.update_settings, room_id,
+                                       work_duration, short_break, long_break)
                 
-                # YENİ: Frontend'den gelen "Süre Bitti" sinyali
+                # Frontend'den gelen "Süre Bitti" sinyali (bitişi sunucu zamanlayıcısı belirler)
                 elif message_type == "timer_completed":
-                    await manager.finish_timer_and_reward(room_id)
+                    await manager.call(room_id, manager.handle_client_completion, room_id)
+                
+                # Saat eşitleme: sunucunun alış zamanı mümkün olduğunca erken alınır
+                elif message_type == "time_sync":
+                    manager.send_time_sync(connection, data.get("t0"), server_now_ms())
+                
+                # Genel liderlik tablosu aboneliği (odadan bağımsız, aktöre uğramaz)
+                elif message_type == "subscribe_leaderboard":
+                    manager.subscribe_leaderboard(connection, data.get("limit"))
+                elif message_type == "unsubscribe_leaderboard":
+                    manager.unsubscribe_leaderboard(connection)
+                
+                # Sayfadan bilerek çıkan kullanıcı için yeniden bağlanma süresi beklenmez
+                elif message_type == "leave":
+                    resumable = False
+                    break
+                
+                if not isinstance(message_type, str) or message_type not in MESSAGES:
+                    message_type = "other"
+                MESSAGES[message_type].inc()
+                MESSAGE_SECONDS[message_type].observe(time.perf_counter() - started)
                 
             except WebSocketDisconnect:
                 break
@@ -519,8 +3332,10 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str):
     except Exception as e:
         logger.error(f"WebSocket hatası: {e}")
     finally:
-        if user_name:
-            manager.disconnect(websocket, room_id)
+        if spectator:
+            manager.disconnect_spectator(websocket, room_id)
+        elif user_name:
+            manager.disconnect(websocket, room_id, resumable)
 
 
 if __name__ == "__main__":